@@ -3,54 +3,280 @@ Content Repurposer - Simple Web Interface
 A Flask-based web app for easy content repurposing.
 """
 
-from flask import Flask, render_template, request, jsonify
+import gzip
+import hashlib
+import hmac
+import json
+import math
+import os
+import sqlite3
+import time
+import uuid
+
+from flask import Flask, request, jsonify, make_response
 from repurposer import ContentRepurposer, get_all_platforms, PLATFORMS
+from templates import get_route
+from keypool import get_pool_stats
+from scheduler import get_scheduler
+from limiter import get_limiter_stats
+from history import HistoryStore
+from profiling import MODES as PROFILE_MODES, profile, section
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
 
 app = Flask(__name__)
 
+# Every generation served by the API is kept here; set REPURPOSER_HISTORY_DB
+# to an empty string to disable.
+HISTORY_DB = os.getenv("REPURPOSER_HISTORY_DB", "repurposer_history.db")
+history = HistoryStore(HISTORY_DB) if HISTORY_DB else None
 
-@app.route("/")
-def index():
-    """Render the main page."""
-    return render_template("index.html", platforms=PLATFORMS)
+# Where ?profile=1 / X-Profile request profiles are written.
+PROFILE_DIR = os.getenv("REPURPOSER_PROFILE_DIR", "profiles")
+
+# Request profiling is off unless this is set; clients must then send it as
+# X-Profile-Token.
+PROFILE_TOKEN = os.getenv("REPURPOSER_PROFILE_TOKEN")
+
+# Web profiles kept in PROFILE_DIR; older ones are deleted.
+PROFILE_KEEP = int(os.getenv("REPURPOSER_PROFILE_KEEP", "20"))
+
+# Budget in seconds for a /api/repurpose call that doesn't send "timeout" or
+# X-Request-Timeout; unset means no overall deadline.
+DEFAULT_TIMEOUT = float(os.environ["REPURPOSER_REQUEST_TIMEOUT"]) if os.getenv("REPURPOSER_REQUEST_TIMEOUT") else None
+
+# Static responses may be cached by browsers and proxies; they revalidate
+# cheaply via ETag once max-age runs out.
+STATIC_CACHE_CONTROL = "public, max-age=3600"
+
+# API responses smaller than this are not worth the CPU to compress.
+COMPRESS_MIN_SIZE = 1024
+
+
+def _compress(body: bytes, encoding: str, level: int) -> bytes:
+    """Compress a body with the given content-coding."""
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    return gzip.compress(body, compresslevel=min(level, 9))
+
+
+def _negotiate_encoding(available) -> str:
+    """Pick the best content-coding the client accepts, or "identity"."""
+    accepted = request.accept_encodings
+    for encoding in ("br", "gzip"):
+        if encoding in available and accepted.quality(encoding) > 0:
+            return encoding
+    return "identity"
+
+
+class CachedAsset:
+    """
+    A response body precomputed once in every content-coding we serve.
+
+    Each encoding gets its own strong ETag, so conditional requests can be
+    answered with a 304 without touching the body at all.
+    """
+
+    def __init__(self, body: bytes, mimetype: str, cache_control: str = STATIC_CACHE_CONTROL):
+        digest = hashlib.sha256(body).hexdigest()[:32]
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.bodies = {"identity": body, "gzip": _compress(body, "gzip", 9)}
+        if brotli is not None:
+            self.bodies["br"] = _compress(body, "br", 11)
+        self.etags = {
+            encoding: digest if encoding == "identity" else f"{digest}-{encoding}"
+            for encoding in self.bodies
+        }
+
+    def response(self):
+        """Build the (possibly 304) response for the current request."""
+        encoding = _negotiate_encoding(self.bodies)
+        etag = self.etags[encoding]
+
+        if request.if_none_match.contains(etag):
+            response = make_response("", 304)
+        else:
+            response = make_response(self.bodies[encoding])
+            response.mimetype = self.mimetype
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = self.cache_control
+        response.vary.add("Accept-Encoding")
+        return response
+
+
+def _profile_mode():
+    """Profiling mode requested via ?profile= or X-Profile (None if off)."""
+    value = (request.args.get("profile") or request.headers.get("X-Profile") or "").lower()
+    if value in ("", "0", "false", "off"):
+        return None
+    if value in ("1", "true", "on"):
+        return "cprofile"
+    return value
+
+
+def _profile_allowed() -> bool:
+    """True if profiling is enabled and the request carries the token."""
+    if not PROFILE_TOKEN:
+        return False
+    token = request.headers.get("X-Profile-Token", "")
+    return hmac.compare_digest(token.encode("utf-8"), PROFILE_TOKEN.encode("utf-8"))
+
+
+def _prune_profiles():
+    """Delete all but the newest PROFILE_KEEP web profiles."""
+    reports = {}
+    for name in os.listdir(PROFILE_DIR):
+        if name.startswith("repurpose-"):
+            path = os.path.join(PROFILE_DIR, name)
+            reports.setdefault(name.split(".", 1)[0], []).append((os.path.getmtime(path), path))
+    oldest_first = sorted(reports.values(), key=max)
+    for files in oldest_first[:max(0, len(reports) - PROFILE_KEEP)]:
+        for _, path in files:
+            os.remove(path)
 
 
 @app.route("/api/repurpose", methods=["POST"])
 def api_repurpose():
     """API endpoint to repurpose content."""
+    mode = _profile_mode()
+    if mode is None:
+        return _repurpose()
+    if not _profile_allowed():
+        return jsonify({"error": "Profiling is not enabled for this client"}), 403
+    if mode not in PROFILE_MODES:
+        return jsonify({"error": f"Unknown profile mode: {mode}. Available: {list(PROFILE_MODES)}"}), 400
+    
+    try:
+        with profile(mode) as profiler:
+            response = _repurpose()
+    except RuntimeError:  # another request is already being profiled
+        response = _repurpose()
+        response.headers["X-Profile-Report"] = "busy"
+        return response
+    
+    name = f"repurpose-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    profiler.dump(os.path.join(PROFILE_DIR, name))
+    _prune_profiles()
+    # The report name only; server paths stay private.
+    response.headers["X-Profile-Report"] = name
+    response.headers["Server-Timing"] = ", ".join(
+        f"{name};dur={agg['wall_ms']}" for name, agg in profiler.summary()["sections"].items()
+    )
+    return response
+
+
+def _repurpose():
+    """Handle a repurpose request; returns a Flask response."""
     data = request.get_json()
     
     if not data or "content" not in data:
-        return jsonify({"error": "Missing 'content' field"}), 400
+        return make_response(jsonify({"error": "Missing 'content' field"}), 400)
     
     content = data["content"]
     platform = data.get("platform", "all")
     provider = data.get("provider", "mock")
+    priority = data.get("priority", "interactive")
+    tenant = request.headers.get("X-Tenant") or data.get("tenant", "default")
+    variants = data.get("variants", 1)
+    languages = data.get("languages")
+    timeout = data.get("timeout", request.headers.get("X-Request-Timeout"))
     
     if len(content.strip()) < 50:
-        return jsonify({"error": "Content too short. Please provide at least 50 characters."}), 400
+        return make_response(jsonify({"error": "Content too short. Please provide at least 50 characters."}), 400)
     
     try:
-        repurposer = ContentRepurposer(provider=provider)
-        
-        if platform == "all":
-            results = repurposer.repurpose_all(content)
+        variants = int(variants)
+        timeout = float(timeout) if timeout is not None else DEFAULT_TIMEOUT
+    except (TypeError, ValueError):
+        return make_response(jsonify({"error": "'variants' and 'timeout' must be numbers"}), 400)
+    if timeout is not None and not (timeout > 0 and math.isfinite(timeout)):
+        return make_response(jsonify({"error": "'timeout' must be a positive number of seconds"}), 400)
+    if languages is not None and not (
+        isinstance(languages, list) and all(isinstance(lang, str) and lang.strip() for lang in languages)
+    ):
+        return make_response(jsonify({"error": "'languages' must be a list of language names"}), 400)
+    classes = get_scheduler().classes
+    if not isinstance(priority, str) or priority not in classes:
+        return make_response(jsonify({"error": f"'priority' must be one of {list(classes)}"}), 400)
+    
+    try:
+        repurposer = ContentRepurposer(
+            provider=provider, priority=priority, tenant=tenant, history=history
+        )
+        platforms = None if platform == "all" else [platform]
+        
+        if languages:
+            report = repurposer.repurpose_languages(
+                content, languages, platforms, variants=variants, timeout=timeout
+            )
+            states = [state for by_platform in report["status"].values() for state in by_platform.values()]
+            finished = sum(len(by_platform) for by_platform in report["results"].values())
         else:
-            results = {platform: repurposer.repurpose(content, platform)}
-        
-        return jsonify({
-            "success": True,
-            "results": results
-        })
+            report = repurposer.repurpose_platforms(content, platforms, variants=variants, timeout=timeout)
+            states = list(report["status"].values())
+            finished = len(report["results"])
+        
+        if not finished:
+            # Nothing finished: fail the request, 504 if it simply ran out of time.
+            timed_out = all(state["status"] == "timeout" for state in states)
+            error = states[0]["error"] if states else "Nothing to generate"
+            return make_response(jsonify({"error": error, "status": report["status"]}), 504 if timed_out else 500)
+        
+        with section("json_encode"):
+            return jsonify({
+                "success": True,
+                "partial": finished < len(states),
+                "results": report["results"],
+                "status": report["status"]
+            })
         
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return make_response(jsonify({"error": str(e)}), 500)
 
 
-@app.route("/api/platforms", methods=["GET"])
-def api_platforms():
-    """Get list of supported platforms."""
-    return jsonify({
+@app.route("/api/history", methods=["GET"])
+def api_history():
+    """Search past generations (newest first, cursor-paginated)."""
+    if history is None:
+        return jsonify({"error": "History is disabled"}), 404
+    
+    args = request.args
+    try:
+        page = history.search(
+            query=args.get("q"),
+            platform=args.get("platform"),
+            provider=args.get("provider"),
+            content_hash=args.get("content_hash"),
+            language=args.get("language"),
+            since=args.get("since", type=float),
+            until=args.get("until", type=float),
+            limit=args.get("limit", 20, type=int),
+            cursor=args.get("cursor", type=int)
+        )
+    except sqlite3.OperationalError as e:  # malformed FTS query
+        return jsonify({"error": f"Invalid search query: {e}"}), 400
+    return jsonify(page)
+
+
+@app.route("/api/history/<int:generation_id>", methods=["GET"])
+def api_history_item(generation_id):
+    """Fetch one past generation with its source article."""
+    record = history.get(generation_id) if history is not None else None
+    if record is None:
+        return jsonify({"error": "Not found"}), 404
+    return jsonify(record)
+
+
+def _platforms_payload() -> dict:
+    """Public description of the supported platforms."""
+    return {
         "platforms": [
             {
                 "id": pid,
@@ -60,7 +286,70 @@ def api_platforms():
             }
             for pid, p in PLATFORMS.items()
         ]
-    })
+    }
+
+
+PLATFORMS_ASSET = CachedAsset(
+    json.dumps(_platforms_payload()).encode("utf-8"),
+    "application/json"
+)
+
+
+@app.route("/api/platforms", methods=["GET"])
+def api_platforms():
+    """Get list of supported platforms."""
+    return PLATFORMS_ASSET.response()
+
+
+@app.route("/api/routes", methods=["GET"])
+def api_routes():
+    """Per-platform routing policy (empty fields use the request's provider)."""
+    return jsonify({"routes": {platform: get_route(platform) for platform in PLATFORMS}})
+
+
+@app.route("/api/keys", methods=["GET"])
+def api_keys():
+    """Per-key usage, latency and ejection state for every key pool."""
+    return jsonify({"pools": get_pool_stats()})
+
+
+@app.route("/api/scheduler", methods=["GET"])
+def api_scheduler():
+    """Scheduler queue depths, in-flight calls and provider limits."""
+    return jsonify(get_scheduler().stats())
+
+
+@app.route("/api/limits", methods=["GET"])
+def api_limits():
+    """Current adaptive concurrency limit and latency figures per provider."""
+    return jsonify({"providers": get_limiter_stats()})
+
+
+@app.after_request
+def compress_api_response(response):
+    """Compress large JSON API responses for clients that accept it."""
+    if (
+        not request.path.startswith("/api/")
+        or response.status_code != 200
+        or response.mimetype != "application/json"
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+
+    available = ("br", "gzip") if brotli is not None else ("gzip",)
+    encoding = _negotiate_encoding(available)
+    response.vary.add("Accept-Encoding")
+    if encoding == "identity":
+        return response
+
+    response.set_data(_compress(body, encoding, 5 if encoding == "br" else 6))
+    response.headers["Content-Encoding"] = encoding
+    return response
 
 
 # HTML template (inline for simplicity)
@@ -327,6 +616,7 @@ Minimum 50 characters required."></textarea>
                         <option value="zai">Z.ai GLM-5</option>
                         <option value="openai">OpenAI GPT-4</option>
                         <option value="anthropic">Anthropic Claude</option>
+                        <option value="local">Local (OpenAI-compatible)</option>
                     </select>
                 </div>
             </div>
@@ -373,7 +663,7 @@ Minimum 50 characters required."></textarea>
                     throw new Error(data.error || 'Failed to repurpose content');
                 }
                 
-                displayResults(data.results);
+                displayResults(data.results, data.status);
                 
             } catch (error) {
                 resultsDiv.innerHTML = `<div class="error">Error: ${error.message}</div>`;
@@ -383,7 +673,7 @@ Minimum 50 characters required."></textarea>
             }
         }
         
-        function displayResults(results) {
+        function displayResults(results, status) {
             const resultsDiv = document.getElementById('results');
             
             let html = '<h2>🎉 Repurposed Content</h2>';
@@ -395,14 +685,24 @@ Minimum 50 characters required."></textarea>
                 tiktok: '🎵'
             };
             
-            for (const [platform, content] of Object.entries(results)) {
-                html += `
-                    <div class="platform-result">
-                        <h3>${platformEmojis[platform] || '📄'} ${platform.charAt(0).toUpperCase() + platform.slice(1)}</h3>
-                        <div class="content">${escapeHtml(content)}</div>
-                        <button class="copy-btn" onclick="copyToClipboard(this, '${platform}')">📋 Copy to Clipboard</button>
-                    </div>
-                `;
+            for (const [platform, result] of Object.entries(results)) {
+                const versions = Array.isArray(result) ? result : [result];
+                versions.forEach((content, i) => {
+                    const label = versions.length > 1 ? ` (Variant ${i + 1})` : '';
+                    html += `
+                        <div class="platform-result">
+                            <h3>${platformEmojis[platform] || '📄'} ${platform.charAt(0).toUpperCase() + platform.slice(1)}${label}</h3>
+                            <div class="content">${escapeHtml(content)}</div>
+                            <button class="copy-btn" onclick="copyToClipboard(this, '${platform}')">📋 Copy to Clipboard</button>
+                        </div>
+                    `;
+                });
+            }
+            
+            for (const [platform, state] of Object.entries(status || {})) {
+                if (state.status !== 'ok') {
+                    html += `<div class="error">${platformEmojis[platform] || '📄'} ${platform}: ${escapeHtml(state.error)}</div>`;
+                }
             }
             
             resultsDiv.innerHTML = html;
@@ -432,17 +732,23 @@ Minimum 50 characters required."></textarea>
 """
 
 
+# The page only depends on PLATFORMS, so render it once at import time.
+INDEX_ASSET = CachedAsset(
+    app.jinja_env.from_string(HTML_TEMPLATE).render(platforms=PLATFORMS).encode("utf-8"),
+    "text/html"
+)
+
+
 @app.route("/templates/index.html")
 def get_template():
     """Serve the inline template."""
-    return HTML_TEMPLATE
+    return INDEX_ASSET.response()
 
 
-# Override the index route to use inline template
 @app.route("/")
 def index_inline():
     """Render the main page with inline template."""
-    return HTML_TEMPLATE
+    return INDEX_ASSET.response()
 
 
 if __name__ == "__main__":
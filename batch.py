@@ -0,0 +1,300 @@
+"""
+Bulk backfills through provider batch APIs.
+Packages article x platform prompts into one OpenAI Batch or Anthropic
+Message Batches job, polls until it finishes and maps the results back by
+custom id. Batch jobs trade latency (up to 24h) for roughly half the price of
+synchronous calls, which suits non-interactive backfills.
+"""
+
+import json
+import time
+import urllib.error
+import urllib.request
+import uuid
+from typing import Optional
+
+from providers import get_provider, get_endpoint, get_model
+from templates import get_template, get_template_version, get_all_platforms
+
+
+TERMINAL_STATUSES = {
+    "openai": {"completed", "failed", "expired", "cancelled"},
+    "anthropic": {"ended"}
+}
+
+
+def _api_base(endpoint: str) -> str:
+    """Turn a provider's chat endpoint into its API root (".../v1")."""
+    for suffix in ("/chat/completions", "/messages"):
+        if endpoint.endswith(suffix):
+            return endpoint[:-len(suffix)]
+    return endpoint.rstrip("/")
+
+
+def _custom_id(index: int, platform: str) -> str:
+    # Anthropic restricts custom ids to [a-zA-Z0-9_-]{1,64}.
+    return f"a{index}-{platform}"
+
+
+def _parse_custom_id(custom_id: str) -> tuple:
+    index, platform = custom_id[1:].split("-", 1)
+    return int(index), platform
+
+
+class BatchRepurposer:
+    """
+    Submits repurposing work to a provider's asynchronous batch API.
+
+    Args:
+        repurposer: A ContentRepurposer whose provider declares a
+            "batch_api" ("openai" or "anthropic"); its key, model, endpoint
+            override and history store are reused
+    """
+
+    def __init__(self, repurposer):
+        self.repurposer = repurposer
+        self.config = get_provider(repurposer.provider)
+        self.api = self.config.get("batch_api")
+        if self.api not in TERMINAL_STATUSES:
+            raise ValueError(f"Provider '{repurposer.provider}' has no batch API support")
+        self.base = _api_base(repurposer.base_url or get_endpoint(repurposer.provider))
+        self.model = repurposer.model or get_model(repurposer.provider)
+
+    def _headers(self, params: dict) -> tuple:
+        """Request body and auth headers as the provider's builder makes them."""
+        return self.config["build_request"](params, self.repurposer.api_key)
+
+    def _request(self, method: str, url: str, body: Optional[bytes] = None,
+                 content_type: str = "application/json"):
+        _, headers = self._headers({"prompt": "", "model": self.model, "temperature": 0, "max_tokens": 1})
+        headers["Content-Type"] = content_type
+        req = urllib.request.Request(url, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                return response.read()
+        except urllib.error.URLError as e:
+            raise ConnectionError(f"Failed to call {self.config['name']} batch API: {e}")
+
+    def _json(self, method: str, path_or_url: str, payload: Optional[dict] = None) -> dict:
+        url = path_or_url if "://" in path_or_url else self.base + path_or_url
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        return json.loads(self._request(method, url, body).decode("utf-8"))
+
+    def _route(self, platform: str) -> dict:
+        """
+        The platform's route, if it stays on this provider. A batch job runs
+        on one provider, so platforms routed elsewhere use its defaults.
+        """
+        route = self.repurposer.route(platform)
+        if route["provider"] != self.repurposer.provider:
+            route = dict(route, model=self.model, temperature=None)
+        return route
+
+    def _requests(self, contents: list, platforms: list) -> list:
+        """(custom_id, request body) for every article x platform pair."""
+        items = []
+        for index, content in enumerate(contents):
+            for platform in platforms:
+                route = self._route(platform)
+                params = {
+                    "prompt": get_template(platform).format(content=content),
+                    "model": route["model"],
+                    "temperature": route["temperature"],
+                    "max_tokens": route["max_tokens"],
+                    "stop": route["stop"]
+                }
+                data, _ = self._headers(params)
+                items.append((_custom_id(index, platform), data))
+        return items
+
+    def submit(self, contents: list, platforms: Optional[list] = None) -> dict:
+        """
+        Submit one batch job covering every article x platform.
+
+        Returns:
+            A JSON-serialisable job dict; keep it to poll or collect later
+        """
+        platforms = platforms or get_all_platforms()
+        items = self._requests(contents, platforms)
+
+        if self.api == "openai":
+            batch_id = self._submit_openai(items)
+        else:
+            batch_id = self._submit_anthropic(items)
+
+        return {
+            "provider": self.repurposer.provider,
+            "api": self.api,
+            "batch_id": batch_id,
+            "platforms": platforms,
+            "count": len(contents),
+            "submitted_at": time.time()
+        }
+
+    def _submit_openai(self, items: list) -> str:
+        lines = "\n".join(
+            json.dumps({"custom_id": cid, "method": "POST", "url": "/v1/chat/completions", "body": body})
+            for cid, body in items
+        )
+        boundary = uuid.uuid4().hex
+        form = (
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="purpose"\r\n\r\n'
+            "batch\r\n"
+            f"--{boundary}\r\n"
+            'Content-Disposition: form-data; name="file"; filename="batch.jsonl"\r\n'
+            "Content-Type: application/jsonl\r\n\r\n"
+            f"{lines}\r\n"
+            f"--{boundary}--\r\n"
+        ).encode("utf-8")
+        uploaded = json.loads(self._request(
+            "POST", self.base + "/files", form, f"multipart/form-data; boundary={boundary}"
+        ).decode("utf-8"))
+        batch = self._json("POST", "/batches", {
+            "input_file_id": uploaded["id"],
+            "endpoint": "/v1/chat/completions",
+            "completion_window": "24h"
+        })
+        return batch["id"]
+
+    def _submit_anthropic(self, items: list) -> str:
+        batch = self._json("POST", "/messages/batches", {
+            "requests": [{"custom_id": cid, "params": body} for cid, body in items]
+        })
+        return batch["id"]
+
+    def status(self, job: dict) -> dict:
+        """Current provider-side state of a job: {"status", "done", "raw"}."""
+        if self.api == "openai":
+            raw = self._json("GET", f"/batches/{job['batch_id']}")
+            status = raw["status"]
+        else:
+            raw = self._json("GET", f"/messages/batches/{job['batch_id']}")
+            status = raw["processing_status"]
+        return {"status": status, "done": status in TERMINAL_STATUSES[self.api], "raw": raw}
+
+    def wait(self, job: dict, poll_interval: float = 30.0, timeout: float = 86400.0) -> dict:
+        """
+        Poll until the job reaches a terminal state.
+
+        Raises:
+            TimeoutError: if the job is still running after timeout seconds
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            state = self.status(job)
+            if state["done"]:
+                return state
+            if time.monotonic() + poll_interval > deadline:
+                raise TimeoutError(f"Batch {job['batch_id']} still {state['status']} after {timeout:.0f}s")
+            time.sleep(poll_interval)
+
+    def results(self, job: dict, state: Optional[dict] = None) -> list:
+        """
+        Download a finished job's results, mapped back by custom id.
+
+        Returns:
+            One {platform: text} dict per submitted article, in input order.
+            Failed items read "Error: ..." like repurpose_all().
+        """
+        state = state or self.status(job)
+        results = [
+            {platform: "Error: no result returned" for platform in job["platforms"]}
+            for _ in range(job["count"])
+        ]
+        parse = self._parse_openai_line if self.api == "openai" else self._parse_anthropic_line
+
+        for line in self._result_lines(state["raw"]):
+            record = json.loads(line)
+            index, platform = _parse_custom_id(record["custom_id"])
+            if 0 <= index < len(results):
+                results[index][platform] = parse(record)
+        return results
+
+    def _result_lines(self, raw: dict) -> list:
+        if self.api == "openai":
+            lines = []
+            for file_key in ("output_file_id", "error_file_id"):
+                if raw.get(file_key):
+                    body = self._request("GET", f"{self.base}/files/{raw[file_key]}/content")
+                    lines += body.decode("utf-8").splitlines()
+        else:
+            body = self._request("GET", raw["results_url"]) if raw.get("results_url") else b""
+            lines = body.decode("utf-8").splitlines()
+        return [line for line in lines if line.strip()]
+
+    def _parse_openai_line(self, record: dict) -> str:
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code", 200) >= 400:
+            error = record.get("error") or response.get("body", {}).get("error")
+            return f"Error: {error}"
+        return self.config["parse_response"](response["body"])
+
+    def _parse_anthropic_line(self, record: dict) -> str:
+        result = record["result"]
+        if result["type"] != "succeeded":
+            return f"Error: {result.get('error', result['type'])}"
+        return self.config["parse_response"](result["message"])
+
+    def run(self, contents: list, platforms: Optional[list] = None,
+            poll_interval: float = 30.0, timeout: float = 86400.0) -> list:
+        """Submit, wait and collect in one call (see results())."""
+        job = self.submit(contents, platforms)
+        state = self.wait(job, poll_interval, timeout)
+        results = self.results(job, state)
+        self._record(contents, results)
+        return results
+
+    def _record(self, contents: list, results: list):
+        history = self.repurposer.history
+        if history is None:
+            return
+        for content, outputs in zip(contents, results):
+            for platform, text in outputs.items():
+                failed = text.startswith("Error: ")
+                history.record(
+                    content, platform, self.repurposer.provider,
+                    output=None if failed else text,
+                    error=text[len("Error: "):] if failed else None,
+                    model=self._route(platform)["model"],
+                    template_version=get_template_version(platform)
+                )
+
+
+# CLI interface
+if __name__ == "__main__":
+    import argparse
+    from repurposer import ContentRepurposer
+
+    parser = argparse.ArgumentParser(description="Backfill content through a provider batch API")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    submit_cmd = sub.add_parser("submit", help="Submit articles and print the job as JSON")
+    submit_cmd.add_argument("files", nargs="+", help="Content files, one article each")
+    submit_cmd.add_argument("--provider", default="openai")
+    submit_cmd.add_argument("--platforms", default="all", help="Comma-separated platforms or 'all'")
+
+    collect_cmd = sub.add_parser("collect", help="Wait for a submitted job and print its results")
+    collect_cmd.add_argument("job", help="Job JSON file written by 'submit'")
+    collect_cmd.add_argument("--poll-interval", type=float, default=30.0)
+
+    args = parser.parse_args()
+
+    if args.command == "submit":
+        contents = []
+        for path in args.files:
+            with open(path, "r") as f:
+                contents.append(f.read())
+        platforms = None if args.platforms == "all" else args.platforms.split(",")
+        batcher = BatchRepurposer(ContentRepurposer(provider=args.provider, priority="bulk"))
+        job = batcher.submit(contents, platforms)
+        job["files"] = args.files
+        print(json.dumps(job, indent=2))
+    else:
+        with open(args.job, "r") as f:
+            job = json.load(f)
+        batcher = BatchRepurposer(ContentRepurposer(provider=job["provider"], priority="bulk"))
+        state = batcher.wait(job, poll_interval=args.poll_interval)
+        results = batcher.results(job, state)
+        files = job.get("files") or [str(i) for i in range(job["count"])]
+        print(json.dumps(dict(zip(files, results)), indent=2))
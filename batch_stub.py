@@ -0,0 +1,233 @@
+"""
+Stand-in batch API server for offline testing.
+Implements the OpenAI Batch (/files, /batches) and Anthropic Message Batches
+(/messages/batches) endpoints that batch.py uses, answering every request
+with a canned completion. Jobs finish after a set number of status polls, so
+submit -> wait -> results runs end to end with no network or credentials.
+"""
+
+import json
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+
+def default_reply(custom_id: str, body: dict) -> Optional[str]:
+    """Canned completion for one request; None marks it as failed."""
+    return f"Stub reply for {custom_id}"
+
+
+class BatchStubServer:
+    """
+    Local HTTP server speaking both providers' batch APIs.
+
+    Args:
+        polls_to_finish: Status polls a job answers "in progress" before it ends
+        reply: fn(custom_id, request body) -> text, or None to fail that item
+
+    Attributes:
+        url: API root to use as a base_url prefix ("http://127.0.0.1:<port>/v1")
+        requests: {custom_id: request body} for every item submitted so far
+    """
+
+    def __init__(self, polls_to_finish: int = 1,
+                 reply: Callable[[str, dict], Optional[str]] = default_reply):
+        self.polls_to_finish = polls_to_finish
+        self.reply = reply
+        self.requests = {}
+        self._files = {}
+        self._batches = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._server.server_port}/v1"
+        self._thread = None
+
+    def start(self) -> "BatchStubServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def _dispatch(self, method: str):
+                if not (self.headers.get("Authorization") or self.headers.get("x-api-key")):
+                    return self._send(401, {"error": {"message": "missing API key"}})
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                parts = self.path.split("?", 1)[0].strip("/").split("/")
+                if parts[:1] != ["v1"]:
+                    return self._send(404, {"error": {"message": f"no route for {self.path}"}})
+                with stub._lock:
+                    status, payload = stub._route(method, parts[1:], body, self.headers)
+                self._send(status, payload)
+
+            def _send(self, status: int, payload):
+                if isinstance(payload, bytes):
+                    data, content_type = payload, "application/jsonl"
+                else:
+                    data, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def _route(self, method: str, parts: list, body: bytes, headers) -> tuple:
+        if method == "POST" and parts == ["files"]:
+            return self._upload(body, headers.get("Content-Type", ""))
+        if method == "GET" and len(parts) == 3 and parts[0] == "files" and parts[2] == "content":
+            if parts[1] not in self._files:
+                return 404, {"error": {"message": "no such file"}}
+            return 200, self._files[parts[1]]
+        if method == "POST" and parts == ["batches"]:
+            return self._create_openai(json.loads(body))
+        if method == "GET" and len(parts) == 2 and parts[0] == "batches":
+            return self._poll(parts[1], "openai")
+        if method == "POST" and parts == ["messages", "batches"]:
+            return self._create_anthropic(json.loads(body))
+        if method == "GET" and len(parts) == 3 and parts[:2] == ["messages", "batches"]:
+            return self._poll(parts[2], "anthropic")
+        if method == "GET" and len(parts) == 4 and parts[:2] == ["messages", "batches"] and parts[3] == "results":
+            batch = self._batches.get(parts[2])
+            if batch is None or "results" not in batch:
+                return 404, {"error": {"message": "results not ready"}}
+            return 200, batch["results"]
+        return 404, {"error": {"message": f"no route for {method} /v1/{'/'.join(parts)}"}}
+
+    def _upload(self, body: bytes, content_type: str) -> tuple:
+        if "boundary=" not in content_type:
+            return 400, {"error": {"message": "expected multipart/form-data"}}
+        boundary = content_type.split("boundary=", 1)[1].encode("utf-8")
+        for part in body.split(b"--" + boundary):
+            head, _, content = part.partition(b"\r\n\r\n")
+            if b'name="file"' in head:
+                file_id = f"file-{uuid.uuid4().hex[:12]}"
+                self._files[file_id] = content.rstrip(b"\r\n")
+                return 200, {"id": file_id, "object": "file", "purpose": "batch"}
+        return 400, {"error": {"message": "no file part"}}
+
+    def _create_openai(self, payload: dict) -> tuple:
+        data = self._files.get(payload.get("input_file_id"))
+        if data is None:
+            return 400, {"error": {"message": "unknown input_file_id"}}
+        items = []
+        for line in data.decode("utf-8").splitlines():
+            if line.strip():
+                record = json.loads(line)
+                items.append((record["custom_id"], record["body"]))
+        return 200, self._create(items, "batch", "openai")
+
+    def _create_anthropic(self, payload: dict) -> tuple:
+        items = [(item["custom_id"], item["params"]) for item in payload.get("requests", [])]
+        return 200, self._create(items, "msgbatch", "anthropic")
+
+    def _create(self, items: list, prefix: str, api: str) -> dict:
+        batch_id = f"{prefix}_{uuid.uuid4().hex[:12]}"
+        for custom_id, body in items:
+            self.requests[custom_id] = body
+        self._batches[batch_id] = {"items": items, "polls": 0}
+        return self._state(batch_id, api)
+
+    def _poll(self, batch_id: str, api: str) -> tuple:
+        batch = self._batches.get(batch_id)
+        if batch is None:
+            return 404, {"error": {"message": "no such batch"}}
+        batch["polls"] += 1
+        if batch["polls"] >= self.polls_to_finish and "finished" not in batch:
+            self._finish(batch_id, batch, api)
+        return 200, self._state(batch_id, api)
+
+    def _finish(self, batch_id: str, batch: dict, api: str):
+        done, failed = [], []
+        for custom_id, body in batch["items"]:
+            text = self.reply(custom_id, body)
+            if api == "openai":
+                if text is None:
+                    failed.append({"custom_id": custom_id, "response": None,
+                                   "error": {"code": "stub_error", "message": "failed by stub"}})
+                else:
+                    done.append({"custom_id": custom_id, "error": None, "response": {
+                        "status_code": 200,
+                        "body": {"choices": [{"index": 0, "message": {"role": "assistant", "content": text}}]}
+                    }})
+            elif text is None:
+                done.append({"custom_id": custom_id, "result": {
+                    "type": "errored", "error": {"type": "stub_error", "message": "failed by stub"}
+                }})
+            else:
+                done.append({"custom_id": custom_id, "result": {
+                    "type": "succeeded", "message": {"content": [{"type": "text", "text": text}]}
+                }})
+
+        def jsonl(records):
+            return "\n".join(json.dumps(r) for r in records).encode("utf-8")
+
+        batch["finished"] = True
+        if api == "openai":
+            for key, records in (("output_file_id", done), ("error_file_id", failed)):
+                if records:
+                    file_id = f"file-{uuid.uuid4().hex[:12]}"
+                    self._files[file_id] = jsonl(records)
+                    batch[key] = file_id
+        else:
+            batch["results"] = jsonl(done)
+
+    def _state(self, batch_id: str, api: str) -> dict:
+        batch = self._batches[batch_id]
+        finished = batch.get("finished", False)
+        if api == "openai":
+            return {
+                "id": batch_id,
+                "object": "batch",
+                "status": "completed" if finished else "in_progress",
+                "output_file_id": batch.get("output_file_id"),
+                "error_file_id": batch.get("error_file_id")
+            }
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if finished else "in_progress",
+            "results_url": f"{self.url}/messages/batches/{batch_id}/results" if finished else None
+        }
+
+
+# CLI interface
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run a stand-in batch API server")
+    parser.add_argument("--polls", type=int, default=1, help="Status polls before a job ends")
+    args = parser.parse_args()
+
+    server = BatchStubServer(polls_to_finish=args.polls)
+    print(f"Batch stub listening; set OPENAI_API_URL={server.url}/chat/completions "
+          f"or ANTHROPIC_API_URL={server.url}/messages")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,216 @@
+"""
+Platform output constraints.
+Checks generated posts against each platform's format limits, and watches
+streamed output so a generation can be cancelled as soon as it is complete
+or has run past a limit (a 9th tweet, too many spoken words, ...).
+"""
+
+import difflib
+import re
+from typing import Optional
+
+from templates import PLATFORMS
+
+
+# Variants at least this similar (difflib ratio, after normalising
+# whitespace and case) count as duplicates.
+DUPLICATE_SIMILARITY = 0.9
+
+TWEET_HEADER = re.compile(r"^\s*Tweet\s+(\d+)[^\n]*:", re.MULTILINE)
+SECTION_HEADER = re.compile(r"^[A-Z][A-Z /-]+\([^)]*\):?", re.MULTILINE)
+VISUAL_CUE = re.compile(r"\[[^\]]*\]")
+TIKTOK_FOOTER = re.compile(r"ESTIMATED RUNTIME:[^\n]*\n\s*-{3,}")
+SENTENCE_END = re.compile(r"[.!?…][\"'”’)\]]*(?=\s)|\n")
+WORD_END = re.compile(r"\S(?=\s)")
+
+# Watchdog stop reasons that mean content past a limit was cut off, as
+# opposed to "format_complete" (the platform format ended on its own).
+TRIMMED_STOP_REASONS = {"tweet_limit", "word_limit", "char_limit"}
+
+
+def split_tweets(text: str) -> list:
+    """Split a "Tweet N:" formatted thread into tweet bodies."""
+    headers = list(TWEET_HEADER.finditer(text))
+    tweets = []
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        tweets.append(text[header.end():end].strip())
+    return tweets
+
+
+def spoken_words(script: str) -> int:
+    """Count the words a TikTok script actually says out loud."""
+    body = script.split("\n---", 1)[0]
+    body = VISUAL_CUE.sub(" ", body)
+    body = SECTION_HEADER.sub(" ", body)
+    return len(re.findall(r"[\w'’-]+", body))
+
+
+def is_trimmed(stop_reason) -> bool:
+    """True if a stop reason means the output was cut short."""
+    return stop_reason in TRIMMED_STOP_REASONS
+
+
+def _boundary_cut(text: str, fits) -> int:
+    """
+    Length of the longest prefix of text for which fits(prefix) holds,
+    ending at a sentence end if possible, else at a word end (0 if none).
+    """
+    for pattern in (SENTENCE_END, WORD_END):
+        for match in reversed(list(pattern.finditer(text))):
+            if fits(text[:match.end()]):
+                return match.end()
+    return 0
+
+
+def check_constraints(platform: str, text: str) -> list:
+    """
+    Check an output against its platform's limits.
+
+    Returns:
+        List of human-readable violations (empty when the output passes)
+    """
+    info = PLATFORMS[platform]
+    violations = []
+
+    if platform == "twitter":
+        tweets = split_tweets(text)
+        if not tweets:
+            violations.append("no 'Tweet N:' sections found")
+        elif not info["min_tweets"] <= len(tweets) <= info["max_tweets"]:
+            violations.append(f"{len(tweets)} tweets (expected {info['min_tweets']}-{info['max_tweets']})")
+        for number, tweet in enumerate(tweets, 1):
+            if len(tweet) > info["max_length"]:
+                violations.append(f"tweet {number} is {len(tweet)} characters (max {info['max_length']})")
+    elif platform == "tiktok":
+        words = spoken_words(text)
+        if words > info["max_length"]:
+            violations.append(f"{words} spoken words (max {info['max_length']})")
+    elif len(text) > info["max_length"]:
+        violations.append(f"{len(text)} characters (max {info['max_length']})")
+
+    return violations
+
+
+class StreamWatchdog:
+    """
+    Follows a streamed generation and decides when to cancel it.
+
+    Feed each text delta to feed(); once it returns True the caller should
+    close the stream. output holds the text to keep (anything past the
+    limit is trimmed) and stop_reason says why it stopped.
+    """
+
+    def __init__(self, platform: str):
+        self.platform = platform
+        self.info = PLATFORMS[platform]
+        self.text = ""
+        self.output = None
+        self.stop_reason = None
+
+    def feed(self, delta: str) -> bool:
+        """Add a delta; returns True when the generation should be cancelled."""
+        if self.stop_reason is not None:
+            return True
+        self.text += delta
+
+        check = getattr(self, f"_check_{self.platform}", self._check_length)
+        cut, reason = check(delta)
+        if reason is not None:
+            self.output = self.text[:cut].rstrip()
+            self.stop_reason = reason
+            return True
+        return False
+
+    def result(self) -> str:
+        """Final text, trimmed if the watchdog cancelled the stream."""
+        return self.output if self.output is not None else self.text
+
+    def _check_twitter(self, delta: str):
+        if "\n" not in delta and ":" not in delta:
+            return None, None
+        for header in TWEET_HEADER.finditer(self.text):
+            if int(header.group(1)) > self.info["max_tweets"]:
+                return header.start(), "tweet_limit"
+        return None, None
+
+    def _check_tiktok(self, delta: str):
+        if "\n" not in delta and "-" not in delta:
+            return None, None
+        footer = TIKTOK_FOOTER.search(self.text)
+        if footer:
+            return footer.end(), "format_complete"
+
+        # Only count finished lines so a half-streamed word is never counted.
+        complete = self.text[:self.text.rfind("\n") + 1]
+        limit = self.info["max_length"]
+        if spoken_words(complete) > limit:
+            return _boundary_cut(complete, lambda prefix: spoken_words(prefix) <= limit), "word_limit"
+        return None, None
+
+    def _check_length(self, delta: str):
+        limit = self.info["max_length"]
+        if len(self.text) <= limit:
+            return None, None
+        # One character past the limit shows whether a word ends right at it.
+        cut = _boundary_cut(self.text[:limit + 1], lambda prefix: len(prefix) <= limit)
+        return (cut or limit), "char_limit"
+
+
+def trim_to_constraints(platform: str, text: str) -> tuple:
+    """
+    Apply the watchdog's trimming to an already complete output.
+
+    Returns:
+        (text, stop_reason); stop_reason is None if nothing was cut
+    """
+    watchdog = StreamWatchdog(platform)
+    for line in text.splitlines(keepends=True):
+        if watchdog.feed(line):
+            break
+    return watchdog.result(), watchdog.stop_reason
+
+
+def _normalise(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _similar(a: str, b: str) -> bool:
+    matcher = difflib.SequenceMatcher(None, a, b, autojunk=False)
+    # quick_ratio() is a cheap upper bound; skip the full diff when it fails.
+    return matcher.quick_ratio() >= DUPLICATE_SIMILARITY and matcher.ratio() >= DUPLICATE_SIMILARITY
+
+
+def dedupe_variants(texts: list) -> list:
+    """Drop variants that are near-identical to an earlier one."""
+    kept, normalised = [], []
+    for text in texts:
+        norm = _normalise(text)
+        if not any(_similar(norm, other) for other in normalised):
+            kept.append(text)
+            normalised.append(norm)
+    return kept
+
+
+def rank_variants(platform: str, texts: list, stop_reasons: Optional[list] = None) -> list:
+    """
+    Order variants best first: fewest constraint violations, then outputs
+    that were not trimmed, then the fullest use of the platform's length
+    budget.
+
+    Args:
+        platform: Platform the variants were generated for
+        texts: Variant texts
+        stop_reasons: Watchdog stop reason for each text, if known
+    """
+    trimmed = {text: is_trimmed(reason) for text, reason in zip(texts, stop_reasons or [])}
+
+    def score(text):
+        if platform == "twitter":
+            fill = len(split_tweets(text)) / PLATFORMS[platform]["max_tweets"]
+        elif platform == "tiktok":
+            fill = spoken_words(text) / PLATFORMS[platform]["max_length"]
+        else:
+            fill = len(text) / PLATFORMS[platform]["max_length"]
+        return (len(check_constraints(platform, text)), trimmed.get(text, False), -min(fill, 1.0))
+    return sorted(texts, key=score)
@@ -0,0 +1,224 @@
+"""
+Generation history store.
+Keeps every source article and generated output in SQLite with FTS5 search,
+so past generations can be found and reused instead of paid for again.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY,
+    article_id INTEGER NOT NULL REFERENCES articles(id),
+    platform TEXT NOT NULL,
+    language TEXT,
+    provider TEXT NOT NULL,
+    model TEXT,
+    template_version TEXT,
+    output TEXT,
+    error TEXT,
+    duration_ms REAL,
+    stop_reason TEXT,
+    created_at REAL NOT NULL
+);
+
+-- search() pages newest first on (created_at, id). SQLite appends the rowid
+-- to every index, so each of these is already in that order for its filter.
+CREATE INDEX IF NOT EXISTS idx_generations_article ON generations(article_id, platform);
+CREATE INDEX IF NOT EXISTS idx_generations_platform ON generations(platform, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_provider ON generations(provider, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_language ON generations(language, created_at);
+CREATE INDEX IF NOT EXISTS idx_generations_created ON generations(created_at);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    content, content='articles', content_rowid='id'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS generations_fts USING fts5(
+    output, content='generations', content_rowid='id'
+);
+
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS generations_ai AFTER INSERT ON generations BEGIN
+    INSERT INTO generations_fts(rowid, output) VALUES (new.id, coalesce(new.output, ''));
+END;
+"""
+
+# Columns returned by list/search results; the source article is fetched
+# separately so pages stay small.
+SUMMARY_COLUMNS = """
+    g.id, a.content_hash, g.platform, g.language, g.provider, g.model, g.template_version,
+    g.output, g.error, g.stop_reason, g.duration_ms, g.created_at
+"""
+
+MAX_PAGE_SIZE = 100
+
+
+def content_hash(content: str) -> str:
+    """Stable identifier for a source article."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class HistoryStore:
+    """
+    SQLite-backed record of source articles and generated outputs.
+
+    Safe to share between threads: each thread gets its own connection and
+    the database runs in WAL mode so reads never block the writer.
+    """
+
+    def __init__(self, path: str = "repurposer_history.db"):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        # Databases created before the language / stop_reason columns existed.
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(generations)")}
+        for column in ("language", "stop_reason"):
+            if columns and column not in columns:
+                conn.execute(f"ALTER TABLE generations ADD COLUMN {column} TEXT")
+        conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def record(self, content: str, platform: str, provider: str,
+               output: Optional[str] = None, error: Optional[str] = None,
+               model: Optional[str] = None, template_version: Optional[str] = None,
+               duration_ms: Optional[float] = None, language: Optional[str] = None,
+               stop_reason: Optional[str] = None) -> int:
+        """
+        Store one generation (and its source article, once per hash).
+
+        stop_reason is the watchdog's reason for ending the output early
+        (see constraints.StreamWatchdog); None means it was not cut.
+
+        Returns:
+            The new generation id
+        """
+        conn = self._connect()
+        now = time.time()
+        digest = content_hash(content)
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO articles (content_hash, content, created_at) VALUES (?, ?, ?)",
+                (digest, content, now)
+            )
+            article_id = conn.execute(
+                "SELECT id FROM articles WHERE content_hash = ?", (digest,)
+            ).fetchone()[0]
+            cursor = conn.execute(
+                """INSERT INTO generations
+                   (article_id, platform, language, provider, model, template_version,
+                    output, error, duration_ms, stop_reason, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (article_id, platform, language, provider, model, template_version,
+                 output, error, duration_ms, stop_reason, now)
+            )
+            return cursor.lastrowid
+
+    def search(self, query: Optional[str] = None, platform: Optional[str] = None,
+               provider: Optional[str] = None, content_hash: Optional[str] = None,
+               language: Optional[str] = None,
+               since: Optional[float] = None, until: Optional[float] = None,
+               limit: int = 20, cursor: Optional[int] = None) -> dict:
+        """
+        Search generations, newest first, with keyset pagination on
+        (created_at, id) so every filter and date range is an index range
+        scan rather than a sort.
+
+        Args:
+            query: FTS5 query matched against outputs and source articles
+            platform / provider / content_hash / language: Exact-match filters
+            since / until: Unix-time bounds on created_at
+            limit: Page size (capped at MAX_PAGE_SIZE)
+            cursor: next_cursor from the previous page
+
+        Returns:
+            {"items": [...], "next_cursor": int or None}
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses, params = [], []
+
+        if query:
+            clauses.append(
+                "(g.id IN (SELECT rowid FROM generations_fts WHERE generations_fts MATCH ?)"
+                " OR g.article_id IN (SELECT rowid FROM articles_fts WHERE articles_fts MATCH ?))"
+            )
+            params += [query, query]
+        if platform:
+            clauses.append("g.platform = ?")
+            params.append(platform)
+        if provider:
+            clauses.append("g.provider = ?")
+            params.append(provider)
+        if content_hash:
+            clauses.append("a.content_hash = ?")
+            params.append(content_hash)
+        if language:
+            clauses.append("g.language = ?")
+            params.append(language)
+        if since is not None:
+            clauses.append("g.created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("g.created_at < ?")
+            params.append(until)
+        if cursor is not None:
+            clauses.append("(g.created_at, g.id) < (SELECT created_at, id FROM generations WHERE id = ?)")
+            params.append(int(cursor))
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._connect().execute(
+            f"""SELECT {SUMMARY_COLUMNS}
+                FROM generations g JOIN articles a ON a.id = g.article_id
+                {where}
+                ORDER BY g.created_at DESC, g.id DESC
+                LIMIT ?""",
+            params + [limit + 1]
+        ).fetchall()
+
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = items[-1]["id"] if len(rows) > limit else None
+        return {"items": items, "next_cursor": next_cursor}
+
+    def get(self, generation_id: int) -> Optional[dict]:
+        """Fetch one generation together with its source article."""
+        row = self._connect().execute(
+            f"""SELECT {SUMMARY_COLUMNS}, a.content AS source
+                FROM generations g JOIN articles a ON a.id = g.article_id
+                WHERE g.id = ?""",
+            (generation_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def find_by_hash(self, digest: str, platform: Optional[str] = None) -> list:
+        """Successful generations for a source article, newest first."""
+        sql = f"""SELECT {SUMMARY_COLUMNS}
+                  FROM generations g JOIN articles a ON a.id = g.article_id
+                  WHERE a.content_hash = ? AND g.error IS NULL"""
+        params = [digest]
+        if platform:
+            sql += " AND g.platform = ?"
+            params.append(platform)
+        rows = self._connect().execute(sql + " ORDER BY g.id DESC", params).fetchall()
+        return [dict(row) for row in rows]
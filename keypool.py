@@ -0,0 +1,224 @@
+"""
+API key pools.
+Spreads provider calls across several API keys so throughput scales with the
+number of keys, temporarily ejecting keys that are rate limited or rejected.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+
+# How long a key sits out after a rejection, in seconds. A 429 honours the
+# provider's Retry-After header when one is sent.
+RATE_LIMIT_COOLDOWN = 30.0
+AUTH_FAILURE_COOLDOWN = 600.0
+
+# Smoothing factor for the per-key latency moving average.
+LATENCY_EWMA_ALPHA = 0.2
+
+
+def mask_key(key: str) -> str:
+    """Shorten a key for display so stats never leak full credentials."""
+    if len(key) <= 12:
+        return key[:2] + "..."
+    return f"{key[:6]}...{key[-4:]}"
+
+
+def parse_keys(value) -> dict:
+    """
+    Normalise key input into a {key: weight} dict.
+
+    Accepts a single key, a comma-separated string, a list of keys, or a
+    {key: weight} dict.
+    """
+    if not value:
+        return {}
+    if isinstance(value, dict):
+        return {k: float(w) for k, w in value.items() if k}
+    if isinstance(value, str):
+        value = value.split(",")
+    return {k.strip(): 1.0 for k in value if k and k.strip()}
+
+
+def keys_from_env(key_env: Optional[str]) -> dict:
+    """
+    Read keys for a provider from the environment.
+
+    ``<KEY_ENV>S`` (e.g. OPENAI_API_KEYS) may hold a comma-separated pool;
+    otherwise the single ``<KEY_ENV>`` variable is used (commas allowed too).
+    """
+    if not key_env:
+        return {}
+    return parse_keys(os.getenv(key_env + "S") or os.getenv(key_env))
+
+
+class KeyPool:
+    """
+    A thread-safe pool of API keys for one provider.
+
+    Strategies:
+        "least_loaded": pick the key with the fewest in-flight calls per unit
+            of weight, breaking ties on total calls per unit of weight
+        "weighted_round_robin": smooth weighted round-robin over keys
+    """
+
+    STRATEGIES = ("least_loaded", "weighted_round_robin")
+
+    def __init__(self, keys, strategy: str = "least_loaded"):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy}. Available: {list(self.STRATEGIES)}")
+        weights = parse_keys(keys)
+        if not weights:
+            raise ValueError("KeyPool needs at least one API key")
+
+        self.strategy = strategy
+        self._lock = threading.Lock()
+        self._keys = {
+            key: {
+                "weight": max(weight, 0.001),
+                "current": 0.0,  # smooth-WRR running weight
+                "in_flight": 0,
+                "requests": 0,
+                "errors": 0,
+                "rate_limited": 0,
+                "auth_failures": 0,
+                "latency_ewma": None,
+                "ejected_until": 0.0
+            }
+            for key, weight in weights.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def keys(self) -> list:
+        return list(self._keys)
+
+    def acquire(self) -> str:
+        """
+        Reserve a key for one call. Pair every acquire() with release().
+
+        Raises:
+            ConnectionError: if every key is currently ejected
+        """
+        with self._lock:
+            now = time.monotonic()
+            available = [k for k, s in self._keys.items() if s["ejected_until"] <= now]
+            if not available:
+                wait = min(s["ejected_until"] for s in self._keys.values()) - now
+                raise ConnectionError(
+                    f"All {len(self._keys)} API keys are temporarily ejected; retry in {wait:.0f}s"
+                )
+
+            if self.strategy == "weighted_round_robin":
+                key = self._pick_weighted_round_robin(available)
+            else:
+                key = self._pick_least_loaded(available)
+
+            state = self._keys[key]
+            state["in_flight"] += 1
+            state["requests"] += 1
+            return key
+
+    def _pick_least_loaded(self, available: list) -> str:
+        def load(key):
+            state = self._keys[key]
+            return (state["in_flight"] / state["weight"], state["requests"] / state["weight"])
+        return min(available, key=load)
+
+    def _pick_weighted_round_robin(self, available: list) -> str:
+        total = 0.0
+        for key in available:
+            state = self._keys[key]
+            state["current"] += state["weight"]
+            total += state["weight"]
+        key = max(available, key=lambda k: self._keys[k]["current"])
+        self._keys[key]["current"] -= total
+        return key
+
+    def release(self, key: str, latency: Optional[float] = None,
+                status: Optional[int] = None, retry_after: Optional[float] = None):
+        """
+        Return a key to the pool and record the outcome of the call.
+
+        Args:
+            key: Key previously returned by acquire()
+            latency: Wall-clock seconds the call took
+            status: HTTP status (None for transport errors)
+            retry_after: Provider-requested cooldown for 429 responses
+        """
+        with self._lock:
+            state = self._keys[key]
+            state["in_flight"] = max(0, state["in_flight"] - 1)
+
+            if latency is not None and status is not None and status < 400:
+                if state["latency_ewma"] is None:
+                    state["latency_ewma"] = latency
+                else:
+                    state["latency_ewma"] += LATENCY_EWMA_ALPHA * (latency - state["latency_ewma"])
+
+            if status is None or status >= 400:
+                state["errors"] += 1
+            if status == 429:
+                state["rate_limited"] += 1
+                self._eject(state, retry_after or RATE_LIMIT_COOLDOWN)
+            elif status in (401, 403):
+                state["auth_failures"] += 1
+                self._eject(state, AUTH_FAILURE_COOLDOWN)
+
+    def _eject(self, state: dict, seconds: float):
+        state["ejected_until"] = max(state["ejected_until"], time.monotonic() + seconds)
+
+    def stats(self) -> list:
+        """Per-key usage, latency and ejection state (keys are masked)."""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": mask_key(key),
+                    "weight": s["weight"],
+                    "in_flight": s["in_flight"],
+                    "requests": s["requests"],
+                    "errors": s["errors"],
+                    "rate_limited": s["rate_limited"],
+                    "auth_failures": s["auth_failures"],
+                    "avg_latency": round(s["latency_ewma"], 4) if s["latency_ewma"] is not None else None,
+                    "ejected_for": round(max(0.0, s["ejected_until"] - now), 1)
+                }
+                for key, s in self._keys.items()
+            ]
+
+
+# Pools are shared process-wide so usage and ejections carry over between
+# ContentRepurposer instances (the web app creates one per request).
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_key_pool(provider: str, keys, strategy: str = "least_loaded") -> Optional[KeyPool]:
+    """
+    Get the shared pool for a provider and key set, creating it on first use.
+
+    Returns None when no keys are given.
+    """
+    weights = parse_keys(keys)
+    if not weights:
+        return None
+    pool_id = (provider, strategy, tuple(sorted(weights.items())))
+    with _POOLS_LOCK:
+        if pool_id not in _POOLS:
+            _POOLS[pool_id] = KeyPool(weights, strategy=strategy)
+        return _POOLS[pool_id]
+
+
+def get_pool_stats() -> dict:
+    """Stats for every live pool, keyed by provider."""
+    with _POOLS_LOCK:
+        pools = list(_POOLS.items())
+    stats = {}
+    for (provider, _, _), pool in pools:
+        stats.setdefault(provider, []).extend(pool.stats())
+    return stats
@@ -0,0 +1,195 @@
+"""
+Adaptive concurrency limits.
+Each provider gets an AIMD limiter driven by observed latency and overload
+signals: the limit creeps up while latency holds steady and is cut back on
+429s, timeouts or a rising p95, so callers run at the highest concurrency the
+provider currently sustains without hand tuning.
+
+"Rising" is judged gradient-style: the p95 of the last few calls against a
+slow moving average of that p95. LLM latency varies widely with output
+length, so a spread that is always there is not congestion; only latency
+that climbs above its own recent norm is. Each call class (the platform
+being generated) keeps its own figures, so a 9s LinkedIn post next to a 3s
+tweet thread is not mistaken for a slowdown either.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+
+INITIAL_LIMIT = int(os.getenv("REPURPOSER_INITIAL_CONCURRENCY", "4"))
+MAX_LIMIT = int(os.getenv("REPURPOSER_MAX_CONCURRENCY", "64"))
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class AdaptiveLimiter:
+    """
+    Additive-increase / multiplicative-decrease concurrency limit.
+
+    Args:
+        initial_limit: Starting limit
+        min_limit: Never go below this
+        max_limit: Never go above this
+        window: Number of recent latencies used for the short-term p95
+        long_window: Roughly how many calls the long-term p95 averages over
+        tolerance: A call class's short-term p95 may grow to tolerance x its
+            long-term p95 before the limit is reduced
+        backoff: Multiplier applied on 429s, timeouts and rising latency
+    """
+
+    def __init__(self, initial_limit: int = INITIAL_LIMIT, min_limit: int = 1,
+                 max_limit: int = MAX_LIMIT, window: int = 50, long_window: int = 500,
+                 tolerance: float = 2.0, backoff: float = 0.5):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.window = window
+        self.smoothing = 1.0 / max(long_window, 1)
+        self.min_samples = min(10, window)
+
+        self._lock = threading.Lock()
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._samples = {}    # call class -> recent latencies
+        self._baselines = {}  # call class -> long-term p95 (moving average)
+        self._checks = {}     # call class -> windows folded into its baseline
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cut_for = set()  # call classes whose latency caused the last cut
+        self._counts = {"ok": 0, "rate_limited": 0, "timeout": 0, "error": 0}
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def begin(self) -> float:
+        """Record the start of a call; pass the result to end()."""
+        with self._lock:
+            self._in_flight += 1
+        return time.monotonic()
+
+    def end(self, started: float, outcome: str = "ok", key: str = "default"):
+        """
+        Record the end of a call and adjust the limit.
+
+        Args:
+            started: Value returned by begin()
+            outcome: "ok", "rate_limited", "timeout", "error" or
+                "cancelled" (errors and calls cut short by the caller's
+                deadline do not move the limit)
+            key: Call class whose latencies are comparable (e.g. the
+                platform); each class keeps its own baseline and p95
+        """
+        now = time.monotonic()
+        latency = now - started
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._counts[outcome] = self._counts.get(outcome, 0) + 1
+
+            if outcome in ("rate_limited", "timeout"):
+                self._decrease(now, self.backoff, key)
+            elif outcome == "ok":
+                self._on_success(now, started, latency, key)
+
+    def _on_success(self, now: float, started: float, latency: float, key: str):
+        if started < self._last_decrease:
+            # Started under the old limit; says nothing about the new one.
+            return
+        samples = self._samples.setdefault(key, deque(maxlen=self.window))
+        samples.append(latency)
+
+        baseline = self._baselines.get(key)
+        if baseline is None and len(samples) == self.window:
+            # Seed from a full window: under load the first calls to finish
+            # are the quickest ones, so a shorter one would read too low.
+            self._baselines[key] = _percentile(samples, 0.95)
+            self._checks[key] = 1
+        elif baseline is not None and len(samples) >= self.min_samples:
+            p95 = _percentile(samples, 0.95)
+            if p95 <= self.tolerance * baseline:
+                # Follow slowly, but never into congestion. Until long_window
+                # checks are in, this is a plain running mean.
+                self._checks[key] += 1
+                weight = max(self.smoothing, 1.0 / self._checks[key])
+                self._baselines[key] = baseline + weight * (p95 - baseline)
+                self._cut_for.discard(key)
+            elif key not in self._cut_for:
+                # Cut decisively: the next window must be able to tell
+                # whether our load was the cause.
+                if self._decrease(now, self.backoff, key):
+                    self._cut_for.add(key)
+                return
+            elif len(samples) == self.window:
+                # A full window after the cut is no faster: the provider is
+                # slower for everyone, not because of us. Make that the norm.
+                self._baselines[key] = p95
+                self._checks[key] = 1
+                self._cut_for.discard(key)
+            else:
+                return
+
+        # Only probe upward when the current limit is actually being used.
+        if self._in_flight + 1 >= self._limit / 2:
+            self._limit = min(self.max_limit, self._limit + 1.0 / self._limit)
+
+    def _decrease(self, now: float, factor: float, key: str) -> bool:
+        # One cut per round trip: a burst of 429s from the same overload
+        # should not collapse the limit to the floor.
+        samples = self._samples.get(key)
+        cooldown = _percentile(samples, 0.5) if samples else 1.0
+        if now - self._last_decrease < cooldown:
+            return False
+        self._last_decrease = now
+        self._limit = max(self.min_limit, self._limit * factor)
+        for samples in self._samples.values():
+            samples.clear()
+        return True
+
+    def stats(self) -> dict:
+        """Current limit, load and latency figures."""
+        with self._lock:
+            return {
+                "limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "latency": {
+                    key: {
+                        "long_p95": round(baseline, 4),
+                        "p95": round(_percentile(self._samples[key], 0.95), 4) if self._samples[key] else None
+                    }
+                    for key, baseline in self._baselines.items()
+                },
+                "outcomes": dict(self._counts)
+            }
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_limiter(provider: str) -> AdaptiveLimiter:
+    """Get the shared limiter for a provider, creating it on first use."""
+    with _LIMITERS_LOCK:
+        if provider not in _LIMITERS:
+            _LIMITERS[provider] = AdaptiveLimiter()
+        return _LIMITERS[provider]
+
+
+def current_limit(provider: str) -> int:
+    """Current concurrency limit for a provider."""
+    return get_limiter(provider).limit
+
+
+def get_limiter_stats(provider: Optional[str] = None) -> dict:
+    """Limiter stats for one provider, or all providers seen so far."""
+    if provider is not None:
+        return {provider: get_limiter(provider).stats()}
+    with _LIMITERS_LOCK:
+        limiters = list(_LIMITERS.items())
+    return {name: limiter.stats() for name, limiter in limiters}
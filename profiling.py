@@ -0,0 +1,313 @@
+"""
+Opt-in profiling for CLI runs and individual web requests.
+Wraps a run in cProfile (deterministic) or a low-overhead stack sampler, plus
+tracemalloc, and writes standard outputs: .pstats for snakeviz / pstats,
+.folded collapsed stacks for flamegraph.pl / speedscope, and a .json summary
+with named sections (prompt building, provider calls, JSON decode, response
+assembly) and the top allocation sites.
+
+A session belongs to the code that started it: sections and threads count
+only when they run in that context, and worker threads join through bind(),
+so concurrent requests in the same process are left out.
+"""
+
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Optional
+
+
+MODES = ("cprofile", "sampling")
+
+# Seconds between stack samples in "sampling" mode.
+SAMPLE_INTERVAL = 0.005
+
+# Allocation sites listed in the JSON summary.
+TOP_ALLOCATIONS = 25
+
+_active = None
+_active_lock = threading.Lock()
+
+# The session the current code runs under, if any.
+_current = contextvars.ContextVar("profiler", default=None)
+
+
+class Profiler:
+    """
+    One profiling session. Only one can be active per process. It covers
+    the thread that started it plus work handed to other threads through
+    bind() (e.g. repurpose_all's fan-out). Allocations are traced
+    process-wide, so top_allocations can include other requests' work.
+
+    Args:
+        mode: "cprofile" or "sampling"
+        memory: Also trace allocations with tracemalloc
+        interval: Sampling interval in seconds ("sampling" mode)
+    """
+
+    def __init__(self, mode: str = "cprofile", memory: bool = True,
+                 interval: float = SAMPLE_INTERVAL):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profile mode: {mode}. Available: {list(MODES)}")
+        self.mode = mode
+        self.memory = memory
+        self.interval = interval
+
+        self.sections = []
+        self._sections_lock = threading.Lock()
+        self._profiles = []
+        self._threads = set()
+        self._threads_lock = threading.Lock()
+        self._main_profile = None
+        self._stopped = False
+        self._samples = {}
+        self._sampler = None
+        self._stopping = threading.Event()
+        self._owns_tracemalloc = False
+        self.snapshot = None
+        self.wall_time = None
+
+    def start(self):
+        """Start profiling the calling thread; call stop() from the same thread."""
+        self._started = time.perf_counter()
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._owns_tracemalloc = True
+
+        self._threads.add(threading.get_ident())
+        if self.mode == "cprofile":
+            self._main_profile = cProfile.Profile()
+            self._main_profile.enable()
+        else:
+            self._sampler = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+            self._sampler.start()
+
+    def stop(self):
+        with self._threads_lock:
+            self._stopped = True
+            self._threads.discard(threading.get_ident())
+        if self.mode == "cprofile":
+            # cProfile hooks are per thread, so each one is disabled by the
+            # thread that enabled it (see run_in_thread()).
+            self._main_profile.disable()
+            self._profiles.insert(0, self._main_profile)
+        else:
+            self._stopping.set()
+            self._sampler.join()
+
+        if self.memory and tracemalloc.is_tracing():
+            self.snapshot = tracemalloc.take_snapshot()
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+        self.wall_time = time.perf_counter() - self._started
+
+    def run_in_thread(self, fn, *args, **kwargs):
+        """Run fn in the current (worker) thread as part of this session."""
+        ident = threading.get_ident()
+        with self._threads_lock:
+            if self._stopped or ident in self._threads:
+                profile = None
+                joined = False
+            else:
+                self._threads.add(ident)
+                profile = cProfile.Profile() if self.mode == "cprofile" else None
+                joined = True
+        if not joined:
+            return fn(*args, **kwargs)
+
+        if profile is not None:
+            profile.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+            with self._threads_lock:
+                self._threads.discard(ident)
+                # Stragglers that outlive the session are dropped, not merged
+                # into a report that may already be written.
+                if profile is not None and not self._stopped:
+                    self._profiles.append(profile)
+
+    def _sample_loop(self):
+        while not self._stopping.wait(self.interval):
+            with self._threads_lock:
+                threads = set(self._threads)
+            for ident, frame in sys._current_frames().items():
+                if ident not in threads:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                folded = ";".join(reversed(stack))
+                self._samples[folded] = self._samples.get(folded, 0) + 1
+
+    @contextmanager
+    def section(self, name: str):
+        """Time (wall, thread CPU, memory) one named step."""
+        wall = time.perf_counter()
+        cpu = time.thread_time()
+        mem = tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else None
+        try:
+            yield
+        finally:
+            entry = {
+                "name": name,
+                "thread": threading.current_thread().name,
+                "wall_ms": (time.perf_counter() - wall) * 1000,
+                "cpu_ms": (time.thread_time() - cpu) * 1000
+            }
+            if mem is not None and tracemalloc.is_tracing():
+                entry["mem_delta_kb"] = (tracemalloc.get_traced_memory()[0] - mem) / 1024
+            with self._sections_lock:
+                if not self._stopped:
+                    self.sections.append(entry)
+
+    def stats(self) -> Optional[pstats.Stats]:
+        """Merged pstats for all profiled threads ("cprofile" mode)."""
+        if not self._profiles:
+            return None
+        stats = pstats.Stats(self._profiles[0])
+        for profile in self._profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def summary(self) -> dict:
+        """JSON-friendly summary of the session."""
+        by_name = {}
+        for entry in self.sections:
+            agg = by_name.setdefault(entry["name"], {"count": 0, "wall_ms": 0.0, "cpu_ms": 0.0, "max_wall_ms": 0.0})
+            agg["count"] += 1
+            agg["wall_ms"] += entry["wall_ms"]
+            agg["cpu_ms"] += entry["cpu_ms"]
+            agg["max_wall_ms"] = max(agg["max_wall_ms"], entry["wall_ms"])
+            if "mem_delta_kb" in entry:
+                agg["mem_delta_kb"] = agg.get("mem_delta_kb", 0.0) + entry["mem_delta_kb"]
+
+        summary = {
+            "mode": self.mode,
+            "wall_ms": round((self.wall_time or 0.0) * 1000, 3),
+            "sections": {
+                name: {k: round(v, 3) if isinstance(v, float) else v for k, v in agg.items()}
+                for name, agg in by_name.items()
+            }
+        }
+
+        stats = self.stats()
+        if stats is not None:
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:30]
+            summary["top_functions"] = [
+                {
+                    "function": f"{os.path.basename(filename)}:{line}({name})",
+                    "calls": nc,
+                    "tottime_ms": round(tt * 1000, 3),
+                    "cumtime_ms": round(ct * 1000, 3)
+                }
+                for (filename, line, name), (cc, nc, tt, ct, callers) in rows
+            ]
+        if self._samples:
+            summary["samples"] = sum(self._samples.values())
+
+        if self.snapshot is not None:
+            summary["top_allocations"] = [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_kb": round(stat.size / 1024, 3),
+                    "count": stat.count
+                }
+                for stat in self.snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+            ]
+        return summary
+
+    def dump(self, prefix: str) -> dict:
+        """
+        Write the session to disk.
+
+        Args:
+            prefix: Path prefix; ".json" is always written, plus ".pstats"
+                (cprofile) or ".folded" (sampling)
+
+        Returns:
+            {"json": path, "pstats"/"folded": path}
+        """
+        directory = os.path.dirname(prefix)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        files = {}
+        stats = self.stats()
+        if stats is not None:
+            files["pstats"] = prefix + ".pstats"
+            stats.dump_stats(files["pstats"])
+        if self._samples:
+            files["folded"] = prefix + ".folded"
+            with open(files["folded"], "w") as f:
+                for stack, count in sorted(self._samples.items()):
+                    f.write(f"{stack} {count}\n")
+
+        files["json"] = prefix + ".json"
+        with open(files["json"], "w") as f:
+            json.dump(dict(self.summary(), files=files), f, indent=2)
+        return files
+
+
+@contextmanager
+def profile(mode: str = "cprofile", memory: bool = True):
+    """
+    Profile the enclosed block.
+
+    Raises:
+        RuntimeError: if another profiling session is already running
+    """
+    global _active
+    profiler = Profiler(mode, memory=memory)
+    with _active_lock:
+        if _active is not None:
+            raise RuntimeError("A profiling session is already running")
+        _active = profiler
+    token = _current.set(profiler)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        _current.reset(token)
+        with _active_lock:
+            _active = None
+
+
+def bind(fn):
+    """
+    Wrap fn for another thread (e.g. an executor task) so it runs as part
+    of the caller's profiling session. Returns fn unchanged when the caller
+    is not being profiled.
+    """
+    context = contextvars.copy_context()
+    profiler = context.get(_current)
+    if profiler is None:
+        return fn
+
+    def run(*args, **kwargs):
+        # A Context can only be entered by one thread at a time.
+        return context.copy().run(profiler.run_in_thread, fn, *args, **kwargs)
+    return run
+
+
+@contextmanager
+def section(name: str):
+    """Time a named step if the caller is being profiled; no-op otherwise."""
+    profiler = _current.get()
+    if profiler is None:
+        yield
+        return
+    with profiler.section(name):
+        yield
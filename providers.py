@@ -0,0 +1,223 @@
+"""
+LLM provider registry.
+Each provider declares its endpoint, default model, credentials and how to
+build a request / parse a response, so new backends plug in without touching
+the repurposing logic.
+"""
+
+import json
+import os
+from typing import Optional
+
+
+# Sampling temperature OpenAI-style requests send unless a route sets one.
+# Anthropic requests without one are left to the API's default.
+DEFAULT_TEMPERATURE = 0.7
+
+
+def _sse_data(line: bytes) -> Optional[dict]:
+    """Decode one server-sent-events "data:" line, or None."""
+    line = line.strip()
+    if not line.startswith(b"data:"):
+        return None
+    payload = line[5:].strip()
+    if not payload or payload == b"[DONE]":
+        return None
+    return json.loads(payload)
+
+
+def build_openai_request(params: dict, api_key: Optional[str]) -> tuple:
+    """Build an OpenAI-style chat completions request body and headers."""
+    temperature = params.get("temperature")
+    data = {
+        "model": params["model"],
+        "messages": [
+            {"role": "user", "content": params["prompt"]}
+        ],
+        "temperature": DEFAULT_TEMPERATURE if temperature is None else temperature,
+        "max_tokens": params["max_tokens"]
+    }
+    if params.get("stop"):
+        data["stop"] = params["stop"][:4]
+    if params.get("stream"):
+        data["stream"] = True
+    if params.get("n", 1) > 1:
+        data["n"] = params["n"]
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    return data, headers
+
+
+def parse_openai_response(result: dict) -> str:
+    """Extract the generated text from an OpenAI-style response."""
+    return result["choices"][0]["message"]["content"]
+
+
+def parse_openai_choices(result: dict) -> list:
+    """Extract every generated text from an OpenAI-style n > 1 response."""
+    choices = sorted(result["choices"], key=lambda c: c.get("index", 0))
+    return [choice["message"]["content"] for choice in choices]
+
+
+def parse_openai_stream(line: bytes) -> Optional[str]:
+    """Extract the text delta from one OpenAI-style SSE line."""
+    event = _sse_data(line)
+    if not event or not event.get("choices"):
+        return None
+    return event["choices"][0].get("delta", {}).get("content")
+
+
+def build_anthropic_request(params: dict, api_key: Optional[str]) -> tuple:
+    """Build an Anthropic Messages API request body and headers."""
+    data = {
+        "model": params["model"],
+        "max_tokens": params["max_tokens"],
+        "messages": [
+            {"role": "user", "content": params["prompt"]}
+        ]
+    }
+    if params.get("temperature") is not None:
+        data["temperature"] = params["temperature"]
+    if params.get("stop"):
+        data["stop_sequences"] = params["stop"]
+    if params.get("stream"):
+        data["stream"] = True
+    headers = {
+        "x-api-key": api_key,
+        "Content-Type": "application/json",
+        "anthropic-version": "2023-06-01"
+    }
+    return data, headers
+
+
+def parse_anthropic_response(result: dict) -> str:
+    """Extract the generated text from an Anthropic Messages response."""
+    return result["content"][0]["text"]
+
+
+def parse_anthropic_stream(line: bytes) -> Optional[str]:
+    """Extract the text delta from one Anthropic SSE line."""
+    event = _sse_data(line)
+    if not event or event.get("type") != "content_block_delta":
+        return None
+    return event["delta"].get("text")
+
+
+# Provider configurations. "url_env" / "model_env" let deployments override
+# the defaults without code changes; "batch_api" names the asynchronous batch
+# protocol the provider speaks (see batch.py), if any; "parse_stream" turns
+# one streamed SSE line into a text delta (providers without it never stream);
+# "supports_n" providers return several samples per request via
+# "parse_choices".
+PROVIDERS = {
+    "zai": {
+        "name": "Z.ai GLM-5",
+        "url": "https://api.z.ai/v1/chat/completions",
+        "url_env": "ZAI_API_URL",
+        "model": "glm-5",
+        "model_env": "ZAI_MODEL",
+        "key_env": "ZAI_API_KEY",
+        "requires_key": True,
+        "build_request": build_openai_request,
+        "parse_response": parse_openai_response,
+        "parse_stream": parse_openai_stream
+    },
+    "openai": {
+        "name": "OpenAI GPT-4",
+        "url": "https://api.openai.com/v1/chat/completions",
+        "url_env": "OPENAI_API_URL",
+        "model": "gpt-4o",
+        "model_env": "OPENAI_MODEL",
+        "key_env": "OPENAI_API_KEY",
+        "requires_key": True,
+        "batch_api": "openai",
+        "supports_n": True,
+        "build_request": build_openai_request,
+        "parse_response": parse_openai_response,
+        "parse_choices": parse_openai_choices,
+        "parse_stream": parse_openai_stream
+    },
+    "anthropic": {
+        "name": "Anthropic Claude",
+        "url": "https://api.anthropic.com/v1/messages",
+        "url_env": "ANTHROPIC_API_URL",
+        "model": "claude-sonnet-4-5-20250514",
+        "model_env": "ANTHROPIC_MODEL",
+        "key_env": "ANTHROPIC_API_KEY",
+        "requires_key": True,
+        "batch_api": "anthropic",
+        "build_request": build_anthropic_request,
+        "parse_response": parse_anthropic_response,
+        "parse_stream": parse_anthropic_stream
+    },
+    # Any OpenAI-compatible server (llama.cpp, vLLM, Ollama, LM Studio, ...),
+    # typically a CPU-hosted inference box on the local network.
+    "local": {
+        "name": "Local (OpenAI-compatible)",
+        "url": "http://127.0.0.1:8080/v1/chat/completions",
+        "url_env": "LOCAL_LLM_URL",
+        "model": "local-model",
+        "model_env": "LOCAL_LLM_MODEL",
+        "key_env": "LOCAL_LLM_API_KEY",
+        "requires_key": False,
+        "build_request": build_openai_request,
+        "parse_response": parse_openai_response,
+        "parse_stream": parse_openai_stream
+    }
+}
+
+
+def register_provider(provider: str, **config) -> dict:
+    """
+    Register (or replace) a provider.
+
+    Args:
+        provider: Provider id used in ContentRepurposer(provider=...)
+        **config: Provider settings; "url", "model", "build_request" and
+            "parse_response" are required, the rest default like "local"
+
+    Returns:
+        The stored provider configuration
+    """
+    missing = [k for k in ("url", "model", "build_request", "parse_response") if k not in config]
+    if missing:
+        raise ValueError(f"Provider '{provider}' is missing: {', '.join(missing)}")
+
+    entry = {
+        "name": provider,
+        "url_env": None,
+        "model_env": None,
+        "key_env": None,
+        "requires_key": False,
+        "batch_api": None,
+        "supports_n": False,
+        "parse_stream": None
+    }
+    entry.update(config)
+    PROVIDERS[provider] = entry
+    return entry
+
+
+def get_provider(provider: str) -> dict:
+    """Get the configuration for a provider."""
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown provider: {provider}. Available: {get_all_providers()}")
+    return PROVIDERS[provider]
+
+
+def get_all_providers() -> list:
+    """Get list of all registered providers (plus the built-in "mock")."""
+    return ["mock"] + list(PROVIDERS.keys())
+
+
+def get_endpoint(provider: str) -> str:
+    """Resolve a provider's endpoint URL, honouring its env override."""
+    config = get_provider(provider)
+    return (config["url_env"] and os.getenv(config["url_env"])) or config["url"]
+
+
+def get_model(provider: str) -> str:
+    """Resolve a provider's default model, honouring its env override."""
+    config = get_provider(provider)
+    return (config["model_env"] and os.getenv(config["model_env"])) or config["model"]
@@ -4,139 +4,305 @@ Transforms long-form content into platform-optimized formats using LLM APIs.
 """
 
 import os
+import hashlib
 import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from typing import Optional
-from templates import get_template, get_all_platforms, PLATFORMS
+from templates import (
+    get_template, get_template_version, get_all_platforms, get_route, PLATFORMS, ROUTE_KEYS,
+    DIGEST, LANGUAGE_INSTRUCTION
+)
+from providers import get_provider, get_endpoint, get_model, get_all_providers
+from keypool import get_key_pool, keys_from_env
+from scheduler import get_scheduler
+from limiter import get_limiter
+from transport import get_default_transport, ReplayTransport
+from profiling import bind, profile, section
+from history import content_hash
+from constraints import StreamWatchdog, trim_to_constraints, dedupe_variants, rank_variants
+
+
+# Upper bound on variants per platform in a single request.
+MAX_VARIANTS = 5
+
+# Seconds a single provider call may take; request deadlines only shorten it.
+PROVIDER_TIMEOUT = 60
+
+# Article digests shared by localized fan-out, keyed by
+# (content hash, provider, model, digest template version).
+DIGEST_CACHE_SIZE = 256
+_DIGEST_CACHE = OrderedDict()
+_DIGEST_PENDING = {}
+_DIGEST_LOCK = threading.Lock()
+
+
+def get_digest_version() -> str:
+    """Short hash of the digest template, so edits invalidate the cache."""
+    return hashlib.sha256(DIGEST["template"].encode("utf-8")).hexdigest()[:12]
+
+
+def _time_left(deadline: Optional[float]) -> float:
+    """
+    Timeout for the next blocking step: what is left of a time.monotonic()
+    deadline, capped at PROVIDER_TIMEOUT.
+    
+    Raises:
+        TimeoutError: if the deadline has already passed
+    """
+    if deadline is None:
+        return PROVIDER_TIMEOUT
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Request deadline exceeded")
+    return min(remaining, PROVIDER_TIMEOUT)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds (HTTP dates are ignored)."""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
 
 
 class ContentRepurposer:
     """
     Repurposes long-form content for multiple social media platforms.
-    Supports multiple LLM backends with automatic fallback.
+    Supports any LLM backend registered in providers.PROVIDERS.
     """
     
-    def __init__(self, api_key: Optional[str] = None, provider: str = "zai"):
+    def __init__(self, api_key=None, provider: str = "zai",
+                 model: Optional[str] = None, base_url: Optional[str] = None,
+                 key_strategy: str = "least_loaded", priority: str = "interactive",
+                 tenant: str = "default", history=None, transport=None,
+                 early_stop: bool = True, routes: Optional[dict] = None,
+                 routing: bool = True):
         """
         Initialize the repurposer with an LLM provider.
         
         Args:
-            api_key: API key for the LLM provider (can also use env vars)
-            provider: LLM provider to use ("zai", "openai", "anthropic", "mock")
+            api_key: API key for the LLM provider (can also use env vars). May
+                also be a list of keys, a comma-separated string or a
+                {key: weight} dict to spread calls across a key pool
+            provider: LLM provider to use ("zai", "openai", "anthropic", "local",
+                "mock", or any provider added with register_provider)
+            model: Override the provider's default model
+            base_url: Override the provider's endpoint URL
+            key_strategy: "least_loaded" or "weighted_round_robin"
+            priority: Scheduler class for this instance's calls ("interactive",
+                "batch" or "bulk"); interactive calls jump queued bulk work
+            tenant: Tenant name for per-tenant concurrency caps
+            history: Optional history.HistoryStore that records every generation
+            transport: HTTP transport for provider calls (default chosen by
+                transport.get_default_transport(), which honours the
+                REPURPOSER_RECORD / REPURPOSER_REPLAY env vars)
+            early_stop: Stream responses and cancel them as soon as the
+                platform's format is complete or over its limits
+            routes: {platform: route} overriding the platform routing policy
+                (templates.get_route()) for this instance
+            routing: Apply platform routes; when False every call uses this
+                instance's provider and model
         """
+        if provider != "mock":
+            get_provider(provider)  # fail fast on unknown providers
+        if priority not in get_scheduler().classes:
+            raise ValueError(f"Unknown priority: {priority}. Available: {list(get_scheduler().classes)}")
         self.provider = provider
-        self.api_key = api_key or self._get_api_key(provider)
-        
-    def _get_api_key(self, provider: str) -> Optional[str]:
-        """Get API key from environment variables."""
-        env_vars = {
-            "zai": "ZAI_API_KEY",
-            "openai": "OPENAI_API_KEY", 
-            "anthropic": "ANTHROPIC_API_KEY"
-        }
-        return os.getenv(env_vars.get(provider, ""))
-    
-    def _call_zai(self, prompt: str) -> str:
-        """Call Z.ai GLM-5 API (OpenClaw's default endpoint)."""
-        import urllib.request
-        import urllib.error
-        
-        url = os.getenv("ZAI_API_URL", "https://api.z.ai/v1/chat/completions")
-        
-        if not self.api_key:
-            raise ValueError("ZAI_API_KEY not set. Set environment variable or pass api_key.")
-        
-        data = {
-            "model": "glm-5",
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 2000
-        }
-        
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode("utf-8"),
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+        self.model = model
+        self.base_url = base_url
+        self.priority = priority
+        self.tenant = tenant
+        self.history = history
+        self.transport = transport or get_default_transport()
+        self.early_stop = early_stop
+        self.routing = routing
+        self.routes = routes or {}
+        for platform, route in self.routes.items():
+            unknown = set(route) - set(ROUTE_KEYS)
+            if platform not in PLATFORMS or unknown:
+                raise ValueError(f"Invalid route for {platform}: {sorted(unknown) or 'unknown platform'}")
+            if route.get("provider") not in (None, "mock"):
+                get_provider(route["provider"])
+        self.key_strategy = key_strategy
+        self.key_pool = get_key_pool(
+            provider, api_key or self._get_api_keys(provider), strategy=key_strategy
         )
+        self.api_key = self.key_pool.keys[0] if self.key_pool else None
         
-        try:
-            with urllib.request.urlopen(req, timeout=60) as response:
-                result = json.loads(response.read().decode("utf-8"))
-                return result["choices"][0]["message"]["content"]
-        except urllib.error.URLError as e:
-            raise ConnectionError(f"Failed to call Z.ai API: {e}")
+    def _get_api_keys(self, provider: str) -> dict:
+        """Get API key(s) from environment variables."""
+        if provider == "mock":
+            return {}
+        return keys_from_env(get_provider(provider)["key_env"])
     
-    def _call_openai(self, prompt: str) -> str:
-        """Call OpenAI API."""
-        import urllib.request
-        import urllib.error
-        
-        url = "https://api.openai.com/v1/chat/completions"
-        
-        if not self.api_key:
-            raise ValueError("OPENAI_API_KEY not set")
-        
-        data = {
-            "model": "gpt-4o",
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 2000
-        }
+    def route(self, platform: Optional[str]) -> dict:
+        """
+        Resolve where a platform's calls go: {"provider", "model",
+        "temperature", "max_tokens", "stop"}. platform=None is the digest
+        step, which always uses this instance's provider.
         
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode("utf-8"),
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-        )
+        A route's model wins over this instance's model; a route to another
+        provider uses that provider's default model, endpoint and keys.
+        temperature is None unless the route sets one, leaving the default
+        to the provider's request builder. Mock instances are never routed.
+        """
+        info = PLATFORMS[platform] if platform else DIGEST
+        route = {}
+        if platform and self.routing and self.provider != "mock":
+            route = dict(get_route(platform), **self.routes.get(platform, {}))
         
-        with urllib.request.urlopen(req, timeout=60) as response:
-            result = json.loads(response.read().decode("utf-8"))
-            return result["choices"][0]["message"]["content"]
-    
-    def _call_anthropic(self, prompt: str) -> str:
-        """Call Anthropic Claude API."""
-        import urllib.request
-        import urllib.error
-        
-        url = "https://api.anthropic.com/v1/messages"
-        
-        if not self.api_key:
-            raise ValueError("ANTHROPIC_API_KEY not set")
-        
-        data = {
-            "model": "claude-sonnet-4-5-20250514",
-            "max_tokens": 2000,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ]
+        provider = route.get("provider") or self.provider
+        if provider == "mock":
+            model = None
+        elif provider == self.provider:
+            model = route.get("model") or self.model or get_model(provider)
+        else:
+            model = route.get("model") or get_model(provider)
+        return {
+            "provider": provider,
+            "model": model,
+            "temperature": route.get("temperature"),
+            "max_tokens": route.get("max_tokens", info["max_tokens"]),
+            "stop": info["stop"]
         }
+    
+    def _call_provider(self, prompt: str, platform: Optional[str], n: int = 1,
+                       deadline: Optional[float] = None) -> list:
+        """
+        Call the configured provider through its registry entry.
         
-        req = urllib.request.Request(
-            url,
-            data=json.dumps(data).encode("utf-8"),
-            headers={
-                "x-api-key": self.api_key,
-                "Content-Type": "application/json",
-                "anthropic-version": "2023-06-01"
-            }
-        )
+        Returns a list of (text, stop_reason) pairs: n of them when n > 1
+        (the provider must declare "supports_n"), otherwise one. stop_reason
+        is the watchdog's (see constraints.StreamWatchdog), or None if the
+        output was not cut. platform=None is the digest step, which uses the
+        DIGEST settings and no watchdog.
+        
+        Goes to the platform's route (see route()) with its token cap and
+        stop sequences. When early_stop is
+        on and the provider can stream, the output is watched as it arrives
+        and the request is cancelled once the platform format is complete or
+        a limit is exceeded.
         
-        with urllib.request.urlopen(req, timeout=60) as response:
-            result = json.loads(response.read().decode("utf-8"))
-            return result["content"][0]["text"]
+        With a key pool, a key that is rate limited (429) or rejected
+        (401/403) is ejected and the call is retried on the next key.
+        
+        deadline (a time.monotonic() value) bounds every attempt's timeout,
+        including retries, and cuts a stream off once it passes.
+        """
+        route = self.route(platform)
+        provider = route["provider"]
+        config = get_provider(provider)
+        if provider == self.provider:
+            url = self.base_url or get_endpoint(provider)
+            key_pool = self.key_pool
+        else:
+            url = get_endpoint(provider)
+            key_pool = get_key_pool(provider, self._get_api_keys(provider), strategy=self.key_strategy)
+        
+        # A replay never reaches the provider, so it runs without credentials.
+        if config["requires_key"] and not key_pool and not isinstance(self.transport, ReplayTransport):
+            raise ValueError(f"{config['key_env']} not set. Set environment variable or pass api_key.")
+        
+        stream = platform is not None and n == 1 and self.early_stop and config.get("parse_stream") is not None
+        params = {
+            "prompt": prompt,
+            "model": route["model"],
+            "temperature": route["temperature"],
+            "max_tokens": route["max_tokens"],
+            "stop": route["stop"],
+            "stream": stream,
+            "n": n
+        }
+        
+        limiter = get_limiter(provider)
+        attempts = len(key_pool) if key_pool else 1
+        for attempt in range(attempts):
+            timeout = _time_left(deadline)
+            key = key_pool.acquire() if key_pool else None
+            data, headers = config["build_request"](params, key)
+            body = json.dumps(data).encode("utf-8")
+            
+            start = limiter.begin()
+            status = None
+            retry_after = None
+            outcome = "error"
+            try:
+                try:
+                    if stream:
+                        status, response_headers, texts = self._send_stream(
+                            config, url, body, headers, platform, timeout, deadline
+                        )
+                    else:
+                        status, response_headers, texts = self._send(
+                            config, url, body, headers, platform, n, timeout
+                        )
+                except TimeoutError as e:
+                    # Running out of the caller's budget says nothing about
+                    # the provider, so only full-length timeouts feed the limiter.
+                    outcome = "timeout" if timeout >= PROVIDER_TIMEOUT else "cancelled"
+                    raise TimeoutError(f"Failed to call {config['name']} API: {e}")
+                except ConnectionError as e:
+                    raise ConnectionError(f"Failed to call {config['name']} API: {e}")
+                
+                if status >= 400:
+                    retry_after = _parse_retry_after(response_headers.get("retry-after"))
+                    if status == 429:
+                        outcome = "rate_limited"
+                    if status in (401, 403, 429) and attempt + 1 < attempts:
+                        continue
+                    raise ConnectionError(f"Failed to call {config['name']} API: HTTP Error {status}")
+                
+                outcome = "ok"
+                return texts
+            finally:
+                limiter.end(start, outcome, platform or "digest")
+                if key is not None:
+                    key_pool.release(key, time.monotonic() - start, status, retry_after)
+    
+    def _send(self, config: dict, url: str, body: bytes, headers: dict,
+              platform: str, n: int = 1, timeout: float = PROVIDER_TIMEOUT) -> tuple:
+        """Make a blocking call; returns (status, headers, [(text, stop_reason)] or None)."""
+        response = self.transport.request(url, body, headers, timeout=timeout)
+        if response["status"] >= 400:
+            return response["status"], response["headers"], None
+        with section("json_decode"):
+            result = json.loads(response["body"].decode("utf-8"))
+            if n > 1:
+                texts = config["parse_choices"](result)
+            else:
+                texts = [config["parse_response"](result)]
+        if self.early_stop and platform:
+            return response["status"], response["headers"], [trim_to_constraints(platform, text) for text in texts]
+        return response["status"], response["headers"], [(text, None) for text in texts]
     
-    def _call_mock(self, prompt: str) -> str:
-        """Mock response for testing without API calls."""
-        if "Twitter" in prompt or "tweet" in prompt.lower():
+    def _send_stream(self, config: dict, url: str, body: bytes, headers: dict,
+                     platform: str, timeout: float = PROVIDER_TIMEOUT,
+                     deadline: Optional[float] = None) -> tuple:
+        """Make a streaming call under a StreamWatchdog; same return as _send."""
+        with self.transport.stream(url, body, headers, timeout=timeout) as response:
+            if response.status >= 400:
+                return response.status, response.headers, None
+            watchdog = StreamWatchdog(platform)
+            with section("stream_decode"):
+                for line in response:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        raise TimeoutError("request deadline reached mid-stream")
+                    delta = config["parse_stream"](line)
+                    if delta and watchdog.feed(delta):
+                        break  # leaving the with-block closes the connection
+        return response.status, response.headers, [(watchdog.result(), watchdog.stop_reason)]
+    
+    def _call_mock(self, prompt: str, platform: Optional[str]) -> str:
+        """Mock response for testing without API calls (platform=None: digest)."""
+        if platform is None:
+            source = prompt.split("ORIGINAL CONTENT:\n", 1)[1].rsplit("\n\n---", 1)[0]
+            sentences = [s.strip() for s in source.replace("\n", " ").split(". ") if s.strip()]
+            return "\n".join(f"- {sentence.rstrip('.')}." for sentence in sentences[:8])
+        
+        if platform == "twitter":
             return """Tweet 1 (Hook):
 The biggest mistake creators make?
 
@@ -176,7 +342,7 @@ The result?
 
 Your turn: Which platform are you focusing on this week?"""
         
-        elif "LinkedIn" in prompt:
+        elif platform == "linkedin":
             return """The best content creators I know all follow one rule:
 
 One piece of content, many formats.
@@ -209,7 +375,7 @@ What's your biggest challenge with content creation? Drop it below.
 
 #ContentStrategy #ContentCreation #SocialMediaTips #Productivity"""
         
-        elif "Instagram" in prompt:
+        elif platform == "instagram":
             return """POV: You stopped creating from scratch every day and started repurposing 📈
 
 Here's the exact framework 👇
@@ -272,52 +438,388 @@ ESTIMATED WORD COUNT: 124 words
 ESTIMATED RUNTIME: ~55 seconds
 ---"""
     
-    def repurpose(self, content: str, platform: str) -> str:
+    def repurpose(self, content: str, platform: str, variants: int = 1,
+                  timeout: Optional[float] = None, with_stop_reason: bool = False):
         """
         Repurpose content for a specific platform.
         
         Args:
             content: The long-form content to repurpose
             platform: Target platform ("twitter", "linkedin", "instagram", "tiktok")
+            variants: Number of alternative versions to generate (1-5). Uses
+                the provider's "n" sampling where supported, concurrent calls
+                elsewhere; near-duplicates are dropped
+            timeout: Overall budget in seconds (default: none beyond each
+                provider call's own PROVIDER_TIMEOUT)
+            with_stop_reason: Also return why the output stopped early
             
         Returns:
-            Repurposed content optimized for the platform
+            Repurposed content optimized for the platform, or with variants > 1
+            a list of distinct versions ranked best first. With
+            with_stop_reason, a (content, stop_reason) tuple, where
+            stop_reason is None for a complete output, "format_complete" when
+            the stream was closed after the format ended, or a
+            constraints.TRIMMED_STOP_REASONS value when the output was cut at
+            a platform limit (a list of reasons with variants > 1)
+            
+        Raises:
+            TimeoutError: if the budget runs out first
         """
         if platform not in PLATFORMS:
             raise ValueError(f"Unknown platform: {platform}. Available: {get_all_platforms()}")
+        if not 1 <= variants <= MAX_VARIANTS:
+            raise ValueError(f"variants must be between 1 and {MAX_VARIANTS}")
         
-        template = get_template(platform)
-        prompt = template.format(content=content)
-        
-        # Call the appropriate LLM provider
-        if self.provider == "mock":
-            return self._call_mock(prompt)
-        elif self.provider == "zai":
-            return self._call_zai(prompt)
-        elif self.provider == "openai":
-            return self._call_openai(prompt)
-        elif self.provider == "anthropic":
-            return self._call_anthropic(prompt)
-        else:
-            raise ValueError(f"Unknown provider: {self.provider}")
+        with section("prompt_build"):
+            template = get_template(platform)
+            prompt = template.format(content=content)
+        
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        output, stop_reason = self._run(content, platform, prompt, variants, deadline=deadline)
+        return (output, stop_reason) if with_stop_reason else output
+    
+    def _run(self, content: str, platform: str, prompt: str, variants: int,
+             language: Optional[str] = None, deadline: Optional[float] = None):
+        """
+        Generate, dedupe/rank and record outputs for a built prompt.
+        
+        Returns:
+            (output, stop_reason) with variants=1, otherwise (ranked outputs,
+            their stop reasons)
+        """
+        start = time.monotonic()
+        try:
+            with section("provider_call"):
+                outputs = self._generate(prompt, platform, variants, deadline)
+        except Exception as e:
+            self._record(content, platform, start, error=str(e), language=language)
+            raise
+        
+        if variants == 1:
+            output, stop_reason = outputs[0]
+            self._record(content, platform, start, output=output, language=language, stop_reason=stop_reason)
+            return output, stop_reason
+        
+        stop_reasons = dict(outputs)
+        kept = dedupe_variants([text for text, _ in outputs])
+        ranked = rank_variants(platform, kept, [stop_reasons[text] for text in kept])
+        for output in ranked:
+            self._record(content, platform, start, output=output, language=language,
+                         stop_reason=stop_reasons[output])
+        return ranked, [stop_reasons[text] for text in ranked]
+    
+    def _generate(self, prompt: str, platform: str, n: int,
+                  deadline: Optional[float] = None) -> list:
+        """
+        Produce n (text, stop_reason) outputs for a prompt, in one call
+        where the provider allows.
+        """
+        provider = self.route(platform)["provider"]
+        if provider == "mock":
+            return [(self._call_mock(prompt, platform), None) for _ in range(n)]
+        
+        def call(count):
+            timeout = None if deadline is None else _time_left(deadline)
+            with get_scheduler().slot(provider, self.priority, self.tenant, timeout):
+                return self._call_provider(prompt, platform, count, deadline)
+        
+        if n == 1 or get_provider(provider).get("supports_n"):
+            return call(n)
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            return [output for outputs in pool.map(bind(call), [1] * n) for output in outputs]
+    
+    def _record(self, content: str, platform: str, start: float,
+                output: Optional[str] = None, error: Optional[str] = None,
+                language: Optional[str] = None, stop_reason: Optional[str] = None):
+        """Write a generation to the history store, if one is configured."""
+        if self.history is None:
+            return
+        route = self.route(platform)
+        self.history.record(
+            content, platform, route["provider"],
+            output=output,
+            error=error,
+            language=language,
+            model=route["model"],
+            template_version=get_template_version(platform),
+            duration_ms=(time.monotonic() - start) * 1000,
+            stop_reason=stop_reason
+        )
     
-    def repurpose_all(self, content: str) -> dict:
+    def repurpose_all(self, content: str, variants: int = 1,
+                      timeout: Optional[float] = None) -> dict:
         """
         Repurpose content for all supported platforms.
         
+        Platforms are generated concurrently; the scheduler and adaptive
+        limiter decide how many calls actually hit the provider at once.
+        
+        Args:
+            content: The long-form content to repurpose
+            variants: Versions per platform (see repurpose())
+            timeout: Overall budget in seconds (see repurpose_platforms())
+            
+        Returns:
+            Dictionary with repurposed content (or ranked variant lists) for
+            each platform; failed or unfinished platforms read "Error: ..."
+        """
+        report = self.repurpose_platforms(content, variants=variants, timeout=timeout)
+        return {
+            platform: report["results"].get(platform, f"Error: {state.get('error')}")
+            for platform, state in report["status"].items()
+        }
+    
+    def repurpose_platforms(self, content: str, platforms: Optional[list] = None,
+                            variants: int = 1, timeout: Optional[float] = None) -> dict:
+        """
+        Repurpose content for several platforms under one deadline.
+        
+        Every platform runs concurrently against the same deadline, which
+        bounds its scheduler wait and each provider call's timeout (retries
+        included). When the deadline passes, whatever finished is returned;
+        calls still running hit their shortened timeouts and are dropped.
+        
         Args:
             content: The long-form content to repurpose
+            platforms: Platforms to generate (default: all)
+            variants: Versions per platform (see repurpose())
+            timeout: Overall budget in seconds (default: no deadline)
             
         Returns:
-            Dictionary with repurposed content for each platform
+            {"results": {platform: content} for finished platforms only,
+             "status": {platform: {"status": "ok" | "error" | "timeout",
+                                   "error": message (unless ok),
+                                   "stop_reason": see repurpose() (if ok),
+                                   "duration_ms": float}}}
         """
-        results = {}
-        for platform in get_all_platforms():
+        platforms = platforms or get_all_platforms()
+        for platform in platforms:
+            if platform not in PLATFORMS:
+                raise ValueError(f"Unknown platform: {platform}. Available: {get_all_platforms()}")
+        if not 1 <= variants <= MAX_VARIANTS:
+            raise ValueError(f"variants must be between 1 and {MAX_VARIANTS}")
+        
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        
+        def generate(platform):
+            with section("prompt_build"):
+                prompt = get_template(platform).format(content=content)
+            return self._run(content, platform, prompt, variants, deadline=deadline)
+        
+        jobs = {platform: (generate, platform) for platform in platforms}
+        return self._fan_out(jobs, deadline, start)
+    
+    def _fan_out(self, jobs: dict, deadline: Optional[float], start: float) -> dict:
+        """
+        Run {key: (fn, *args)} concurrently until done or the deadline.
+        Each fn returns (value, stop_reason), as _run() does.
+        
+        Returns:
+            {"results": {key: value}, "status": {key: {...}}} as described in
+            repurpose_platforms()
+        """
+        finished_at = {}
+        
+        def timed(key, fn, *args):
             try:
-                results[platform] = self.repurpose(content, platform)
-            except Exception as e:
-                results[platform] = f"Error: {str(e)}"
-        return results
+                return fn(*args)
+            finally:
+                finished_at[key] = time.monotonic()
+        
+        pool = ThreadPoolExecutor(max_workers=max(1, len(jobs)))
+        futures = {key: pool.submit(bind(timed), key, *job) for key, job in jobs.items()}
+        wait_for = None if deadline is None else max(0.0, deadline - time.monotonic())
+        wait(futures.values(), timeout=wait_for)
+        # Don't hold the response for stragglers; their own timeouts end them.
+        pool.shutdown(wait=False, cancel_futures=True)
+        
+        with section("response_assembly"):
+            results, status = {}, {}
+            for key, future in futures.items():
+                if not future.done() or future.cancelled():
+                    status[key] = {
+                        "status": "timeout",
+                        "error": "Request deadline exceeded",
+                        "duration_ms": (time.monotonic() - start) * 1000
+                    }
+                    continue
+                state = {"duration_ms": (finished_at.get(key, time.monotonic()) - start) * 1000}
+                try:
+                    results[key], state["stop_reason"] = future.result()
+                    state["status"] = "ok"
+                except Exception as e:
+                    state["status"] = "timeout" if isinstance(e, TimeoutError) else "error"
+                    state["error"] = str(e)
+                status[key] = state
+        return {"results": results, "status": status}
+    
+    def digest(self, content: str, timeout: Optional[float] = None) -> str:
+        """
+        Extract an article's key points once, for reuse across outputs.
+        
+        Digests are cached per (article, provider, model), and concurrent
+        requests for the same article share a single provider call.
+        
+        Raises:
+            TimeoutError: if no digest is ready within timeout seconds
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        model = self.route(None)["model"]
+        cache_key = (content_hash(content), self.provider, model, get_digest_version())
+        
+        with _DIGEST_LOCK:
+            if cache_key in _DIGEST_CACHE:
+                _DIGEST_CACHE.move_to_end(cache_key)
+                return _DIGEST_CACHE[cache_key]
+            pending = _DIGEST_PENDING.get(cache_key)
+            owner = pending is None
+            if owner:
+                pending = _DIGEST_PENDING[cache_key] = Future()
+        
+        if not owner:
+            try:
+                return pending.result(timeout=None if deadline is None else _time_left(deadline))
+            except TimeoutError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise TimeoutError("Request deadline exceeded")
+                raise
+        
+        try:
+            with section("digest"):
+                prompt = DIGEST["template"].format(content=content)
+                if self.provider == "mock":
+                    text = self._call_mock(prompt, None)
+                else:
+                    wait_for = None if deadline is None else _time_left(deadline)
+                    with get_scheduler().slot(self.provider, self.priority, self.tenant, wait_for):
+                        text = self._call_provider(prompt, None, deadline=deadline)[0][0]
+        except Exception as e:
+            with _DIGEST_LOCK:
+                del _DIGEST_PENDING[cache_key]
+            pending.set_exception(e)
+            raise
+        
+        with _DIGEST_LOCK:
+            _DIGEST_CACHE[cache_key] = text
+            while len(_DIGEST_CACHE) > DIGEST_CACHE_SIZE:
+                _DIGEST_CACHE.popitem(last=False)
+            del _DIGEST_PENDING[cache_key]
+        pending.set_result(text)
+        return text
+    
+    def repurpose_localized(self, content: str, languages: list,
+                            platforms: Optional[list] = None, variants: int = 1,
+                            timeout: Optional[float] = None) -> dict:
+        """
+        Repurpose content for several languages x platforms.
+        
+        Args:
+            content: The long-form content to repurpose
+            languages: Target languages, e.g. ["English", "German", "pt-BR"]
+            platforms: Platforms to generate (default: all)
+            variants: Versions per output (see repurpose())
+            timeout: Overall budget in seconds (see repurpose_languages())
+            
+        Returns:
+            {language: {platform: content}}; failed or unfinished outputs
+            read "Error: ..."
+        """
+        report = self.repurpose_languages(content, languages, platforms, variants=variants, timeout=timeout)
+        return {
+            lang: {
+                platform: report["results"][lang].get(platform, f"Error: {state.get('error')}")
+                for platform, state in states.items()
+            }
+            for lang, states in report["status"].items()
+        }
+    
+    def repurpose_languages(self, content: str, languages: list,
+                            platforms: Optional[list] = None, variants: int = 1,
+                            timeout: Optional[float] = None) -> dict:
+        """
+        Repurpose content for several languages x platforms under one deadline.
+        
+        The article is digested once; every language x platform output is
+        then generated concurrently from that shared digest, so cost grows
+        with the number of outputs rather than source length x outputs.
+        If the digest fails or runs out of time, every output reports that.
+        
+        Args:
+            content: The long-form content to repurpose
+            languages: Target languages, e.g. ["English", "German", "pt-BR"]
+            platforms: Platforms to generate (default: all)
+            variants: Versions per output (see repurpose())
+            timeout: Overall budget in seconds, digest included (default: no
+                deadline)
+            
+        Returns:
+            {"results": {language: {platform: content}} for finished outputs,
+             "status": {language: {platform: {...}}}}, with each status as
+             described in repurpose_platforms()
+        """
+        platforms = platforms or get_all_platforms()
+        for platform in platforms:
+            if platform not in PLATFORMS:
+                raise ValueError(f"Unknown platform: {platform}. Available: {get_all_platforms()}")
+        if not 1 <= variants <= MAX_VARIANTS:
+            raise ValueError(f"variants must be between 1 and {MAX_VARIANTS}")
+        if isinstance(languages, str):
+            raise ValueError("languages must be a list, e.g. [\"English\", \"German\"]")
+        # Same language asked twice (any case/spacing) is generated once.
+        unique = {}
+        for lang in languages:
+            lang = " ".join(lang.split())
+            if lang:
+                unique.setdefault(lang.casefold(), lang)
+        languages = list(unique.values())
+        
+        start = time.monotonic()
+        deadline = start + timeout if timeout is not None else None
+        try:
+            digest = self.digest(content, timeout)
+        except Exception as e:
+            state = {
+                "status": "timeout" if isinstance(e, TimeoutError) else "error",
+                "error": str(e),
+                "duration_ms": (time.monotonic() - start) * 1000
+            }
+            return {
+                "results": {lang: {} for lang in languages},
+                "status": {lang: {p: dict(state) for p in platforms} for lang in languages}
+            }
+        
+        def generate(language, platform):
+            with section("prompt_build"):
+                prompt = get_template(platform).format(content=digest)
+                prompt += LANGUAGE_INSTRUCTION.format(language=language)
+            return self._run(content, platform, prompt, variants, language=language, deadline=deadline)
+        
+        jobs = {(lang, p): (generate, lang, p) for lang in languages for p in platforms}
+        report = self._fan_out(jobs, deadline, start)
+        
+        results = {lang: {} for lang in languages}
+        status = {lang: {} for lang in languages}
+        for (lang, platform), state in report["status"].items():
+            status[lang][platform] = state
+            if (lang, platform) in report["results"]:
+                results[lang][platform] = report["results"][(lang, platform)]
+        return {"results": results, "status": status}
+    
+    def repurpose_batch(self, contents: list, max_workers: int = 16) -> list:
+        """
+        Repurpose many pieces of content for all platforms.
+        
+        Args:
+            contents: List of long-form content strings
+            max_workers: Articles processed at once (provider concurrency is
+                still governed by the adaptive limiter)
+            
+        Returns:
+            List of repurpose_all() results, in input order
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return list(pool.map(bind(self.repurpose_all), contents))
 
 
 def repurpose_content(content: str, platform: str = "all", provider: str = "mock") -> dict:
@@ -342,25 +844,50 @@ def repurpose_content(content: str, platform: str = "all", provider: str = "mock
 
 # CLI interface
 if __name__ == "__main__":
-    import sys
+    import argparse
     
-    if len(sys.argv) < 2:
-        print("Usage: python repurposer.py <content_file> [platform] [provider]")
-        print("Platforms: twitter, linkedin, instagram, tiktok, all")
-        print("Providers: mock, zai, openai, anthropic")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Repurpose long-form content for social platforms")
+    parser.add_argument("content_file", help="File with the long-form content")
+    parser.add_argument("platform", nargs="?", default="all",
+                        help="twitter, linkedin, instagram, tiktok or all (default: all)")
+    parser.add_argument("provider", nargs="?", default="mock",
+                        help=f"{', '.join(get_all_providers())} (default: mock)")
+    parser.add_argument("--languages",
+                        help="Comma-separated languages for localized output (e.g. English,German)")
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=["cprofile", "sampling"],
+                        help="Profile the run (cprofile by default) with tracemalloc")
+    parser.add_argument("--profile-out", default="repurposer-profile",
+                        help="Path prefix for profile output files")
+    args = parser.parse_args()
     
     # Read content from file
-    with open(sys.argv[1], "r") as f:
+    with open(args.content_file, "r") as f:
         content = f.read()
     
-    platform = sys.argv[2] if len(sys.argv) > 2 else "all"
-    provider = sys.argv[3] if len(sys.argv) > 3 else "mock"
+    def run():
+        if args.languages:
+            repurposer = ContentRepurposer(provider=args.provider)
+            platforms = None if args.platform == "all" else [args.platform]
+            localized = repurposer.repurpose_localized(content, args.languages.split(","), platforms)
+            return {
+                f"{plat} [{lang}]": result
+                for lang, outputs in localized.items()
+                for plat, result in outputs.items()
+            }
+        return repurpose_content(content, args.platform, args.provider)
     
-    results = repurpose_content(content, platform, provider)
+    if args.profile:
+        with profile(args.profile) as profiler:
+            results = run()
+        files = profiler.dump(args.profile_out)
+    else:
+        results = run()
     
     print("\n" + "="*60)
     for plat, result in results.items():
         print(f"\n### {plat.upper()} ###\n")
         print(result)
         print("\n" + "-"*60)
+    
+    if args.profile:
+        print(f"\nProfile written to: {', '.join(files.values())}")
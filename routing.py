@@ -0,0 +1,174 @@
+"""
+Route benchmarking for per-platform model routing.
+Runs sample articles through candidate routes (provider, model, temperature,
+token budget) for each platform, records latency and how often the output
+passes the platform's constraints, and picks the fastest route that still
+meets a pass-rate bar. The picks can be written as a REPURPOSER_ROUTES file.
+"""
+
+import json
+import statistics
+import time
+from typing import Optional
+
+from constraints import check_constraints
+from repurposer import ContentRepurposer
+from templates import get_all_platforms, ROUTE_KEYS
+
+
+# Share of outputs that must pass check_constraints() for a route to be picked.
+MIN_PASS_RATE = 0.9
+
+
+def parse_route(spec: str) -> dict:
+    """Parse "provider[:model[:temperature[:max_tokens]]]" into a route dict."""
+    parts = spec.split(":")
+    if not parts[0] or len(parts) > len(ROUTE_KEYS):
+        raise ValueError(f"Invalid route: {spec!r} (expected provider[:model[:temperature[:max_tokens]]])")
+    route = {"provider": parts[0]}
+    if len(parts) > 1 and parts[1]:
+        route["model"] = parts[1]
+    if len(parts) > 2 and parts[2]:
+        route["temperature"] = float(parts[2])
+    if len(parts) > 3 and parts[3]:
+        route["max_tokens"] = int(parts[3])
+    return route
+
+
+def _percentile(values: list, pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[int(round(pct / 100 * (len(ordered) - 1)))], 1)
+
+
+def benchmark(contents: list, candidates: list, platforms: Optional[list] = None,
+              runs: int = 1, **repurposer_options) -> list:
+    """
+    Measure every candidate route on every platform.
+
+    Calls are made one at a time so latencies are not skewed by the routes
+    competing for the same provider. Early stopping is off: the watchdog
+    would trim over-long outputs before they are checked, hiding the very
+    violations the pass rate measures, so latencies are for full-length
+    generations.
+
+    Args:
+        contents: Sample articles
+        candidates: Route dicts (see templates.ROUTE_KEYS); each needs a
+            "provider"
+        platforms: Platforms to test (default: all)
+        runs: Generations per article, per route and platform
+        **repurposer_options: Passed to ContentRepurposer (e.g. transport;
+            early_stop is always False)
+
+    Returns:
+        One row per (platform, route): runs, errors, pass_rate, latency
+        percentiles in ms and the most common violations
+    """
+    platforms = platforms or get_all_platforms()
+    rows = []
+    for platform in platforms:
+        for candidate in candidates:
+            repurposer = ContentRepurposer(
+                provider=candidate["provider"],
+                priority="batch",
+                routes={platform: candidate},
+                early_stop=False,
+                **repurposer_options
+            )
+            latencies, passed, errors, violations = [], 0, 0, {}
+            for content in contents:
+                for _ in range(runs):
+                    start = time.monotonic()
+                    try:
+                        output = repurposer.repurpose(content, platform)
+                    except Exception:
+                        errors += 1
+                        continue
+                    latencies.append((time.monotonic() - start) * 1000)
+                    problems = check_constraints(platform, output)
+                    if not problems:
+                        passed += 1
+                    for problem in problems:
+                        violations[problem] = violations.get(problem, 0) + 1
+
+            total = len(contents) * runs
+            route = repurposer.route(platform)
+            rows.append({
+                "platform": platform,
+                "route": {k: route[k] for k in ROUTE_KEYS},
+                "runs": total,
+                "errors": errors,
+                "pass_rate": round(passed / total, 3) if total else 0.0,
+                "p50_ms": _percentile(latencies, 50),
+                "p95_ms": _percentile(latencies, 95),
+                "mean_ms": round(statistics.mean(latencies), 1) if latencies else None,
+                "top_violations": sorted(violations, key=violations.get, reverse=True)[:3]
+            })
+    return rows
+
+
+def pick_routes(rows: list, min_pass_rate: float = MIN_PASS_RATE) -> dict:
+    """
+    Fastest route (by p50 latency) per platform among those meeting
+    min_pass_rate. Platforms with no qualifying route are left out.
+
+    Returns:
+        {platform: route}, ready to save as a REPURPOSER_ROUTES file
+    """
+    best = {}
+    for row in rows:
+        if row["pass_rate"] < min_pass_rate or row["p50_ms"] is None:
+            continue
+        current = best.get(row["platform"])
+        if current is None or row["p50_ms"] < current["p50_ms"]:
+            best[row["platform"]] = row
+    return {
+        platform: {k: v for k, v in row["route"].items() if v is not None}
+        for platform, row in best.items()
+    }
+
+
+# CLI interface
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark per-platform routes")
+    parser.add_argument("files", nargs="+", help="Sample content files, one article each")
+    parser.add_argument("--route", action="append", required=True, dest="routes",
+                        help="Candidate provider[:model[:temperature[:max_tokens]]]; repeat for each")
+    parser.add_argument("--platforms", default="all", help="Comma-separated platforms or 'all'")
+    parser.add_argument("--runs", type=int, default=1, help="Generations per article and route")
+    parser.add_argument("--min-pass-rate", type=float, default=MIN_PASS_RATE)
+    parser.add_argument("--out", help="Write the full results as JSON")
+    parser.add_argument("--write", help="Write the picked routes as a REPURPOSER_ROUTES file")
+
+    args = parser.parse_args()
+
+    contents = []
+    for path in args.files:
+        with open(path, "r") as f:
+            contents.append(f.read())
+    candidates = [parse_route(spec) for spec in args.routes]
+    platforms = None if args.platforms == "all" else args.platforms.split(",")
+
+    rows = benchmark(contents, candidates, platforms, runs=args.runs)
+
+    print(f"{'platform':<10} {'route':<40} {'pass':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9}")
+    for row in rows:
+        route = ":".join(str(row["route"][k]) for k in ROUTE_KEYS)
+        print(f"{row['platform']:<10} {route:<40} {row['pass_rate']:>6.0%} {row['errors']:>4} "
+              f"{row['p50_ms'] if row['p50_ms'] is not None else '-':>9} "
+              f"{row['p95_ms'] if row['p95_ms'] is not None else '-':>9}")
+
+    picks = pick_routes(rows, args.min_pass_rate)
+    print("\nPicked routes:")
+    print(json.dumps(picks, indent=2))
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(rows, f, indent=2)
+    if args.write:
+        with open(args.write, "w") as f:
+            json.dump(picks, f, indent=2)
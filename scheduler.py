@@ -0,0 +1,177 @@
+"""
+Provider call scheduler.
+Every provider call takes a slot from a shared scheduler before it goes out,
+so interactive requests are not starved by bulk backfills running in the same
+process. Slots are granted by priority class, weighted fair queuing across
+(class, tenant) flows, per-provider concurrency and per-tenant caps.
+"""
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from limiter import current_limit
+
+
+# Priority classes. "preempt" classes jump ahead of every queued non-preempt
+# ticket; "weight" is the class's share of capacity under weighted fair
+# queuing when several classes are waiting.
+PRIORITY_CLASSES = {
+    "interactive": {"weight": 8, "preempt": True},
+    "batch": {"weight": 3, "preempt": False},
+    "bulk": {"weight": 1, "preempt": False}
+}
+
+
+class Scheduler:
+    """
+    Grants provider-call slots in priority / fair-share order.
+
+    Args:
+        max_concurrency: Concurrent calls allowed per provider, or a callable
+            taking the provider id and returning its current limit (default:
+            the provider's adaptive limit from limiter.py)
+        tenant_limits: Optional {tenant: max concurrent calls}
+        default_tenant_limit: Cap for tenants not in tenant_limits (None = no cap)
+        classes: Priority class table (defaults to PRIORITY_CLASSES)
+    """
+
+    def __init__(self, max_concurrency=current_limit,
+                 tenant_limits: Optional[dict] = None,
+                 default_tenant_limit: Optional[int] = None,
+                 classes: Optional[dict] = None):
+        self.max_concurrency = max_concurrency
+        self.tenant_limits = dict(tenant_limits or {})
+        self.default_tenant_limit = default_tenant_limit
+        self.classes = classes or PRIORITY_CLASSES
+
+        self._lock = threading.Lock()
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._virtual_time = 0.0
+        self._flow_finish = {}  # (class, tenant) -> last virtual finish tag
+        self._provider_in_flight = {}
+        self._tenant_in_flight = {}
+        self._granted = {}  # class -> slots granted so far
+
+    def _provider_limit(self, provider: str) -> int:
+        if callable(self.max_concurrency):
+            return max(1, int(self.max_concurrency(provider)))
+        return self.max_concurrency
+
+    def _tenant_limit(self, tenant: str) -> Optional[int]:
+        return self.tenant_limits.get(tenant, self.default_tenant_limit)
+
+    def _eligible(self, ticket: dict) -> bool:
+        provider, tenant = ticket["provider"], ticket["tenant"]
+        if self._provider_in_flight.get(provider, 0) >= self._provider_limit(provider):
+            return False
+        cap = self._tenant_limit(tenant)
+        return cap is None or self._tenant_in_flight.get(tenant, 0) < cap
+
+    def _dispatch(self):
+        """Grant slots to waiting tickets while capacity allows. Holds _lock."""
+        while True:
+            eligible = [t for t in self._waiting if self._eligible(t)]
+            if not eligible:
+                return
+            preempting = [t for t in eligible if self.classes[t["priority"]]["preempt"]]
+            ticket = min(preempting or eligible, key=lambda t: (t["finish"], t["seq"]))
+
+            self._waiting.remove(ticket)
+            self._virtual_time = max(self._virtual_time, ticket["start"])
+            self._provider_in_flight[ticket["provider"]] = self._provider_in_flight.get(ticket["provider"], 0) + 1
+            self._tenant_in_flight[ticket["tenant"]] = self._tenant_in_flight.get(ticket["tenant"], 0) + 1
+            self._granted[ticket["priority"]] = self._granted.get(ticket["priority"], 0) + 1
+            ticket["granted"] = True
+            ticket["event"].set()
+
+    def acquire(self, provider: str, priority: str = "interactive",
+                tenant: str = "default", timeout: Optional[float] = None) -> dict:
+        """
+        Block until a slot is granted and return its ticket.
+
+        Raises:
+            ValueError: for an unknown priority class
+            TimeoutError: if no slot was granted within timeout seconds
+        """
+        if priority not in self.classes:
+            raise ValueError(f"Unknown priority: {priority}. Available: {list(self.classes)}")
+
+        with self._lock:
+            flow = (priority, tenant)
+            start = max(self._virtual_time, self._flow_finish.get(flow, 0.0))
+            finish = start + 1.0 / self.classes[priority]["weight"]
+            self._flow_finish[flow] = finish
+            ticket = {
+                "provider": provider,
+                "priority": priority,
+                "tenant": tenant,
+                "start": start,
+                "finish": finish,
+                "seq": next(self._sequence),
+                "queued_at": time.monotonic(),
+                "granted": False,
+                "event": threading.Event()
+            }
+            self._waiting.append(ticket)
+            self._dispatch()
+
+        if not ticket["event"].wait(timeout):
+            with self._lock:
+                if not ticket["granted"]:
+                    self._waiting.remove(ticket)
+                    raise TimeoutError(f"No {provider} capacity for {priority} request within {timeout:.1f}s")
+        ticket["wait"] = time.monotonic() - ticket["queued_at"]
+        return ticket
+
+    def release(self, ticket: dict):
+        """Return a slot and hand it to the next waiting ticket."""
+        with self._lock:
+            self._provider_in_flight[ticket["provider"]] -= 1
+            self._tenant_in_flight[ticket["tenant"]] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, provider: str, priority: str = "interactive",
+             tenant: str = "default", timeout: Optional[float] = None):
+        """Context manager around acquire()/release()."""
+        ticket = self.acquire(provider, priority, tenant, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def stats(self) -> dict:
+        """Queue depths and in-flight counts."""
+        with self._lock:
+            queued = {}
+            for t in self._waiting:
+                queued[t["priority"]] = queued.get(t["priority"], 0) + 1
+            return {
+                "queued": queued,
+                "granted": dict(self._granted),
+                "in_flight": {
+                    "providers": {p: n for p, n in self._provider_in_flight.items() if n},
+                    "tenants": {t: n for t, n in self._tenant_in_flight.items() if n}
+                },
+                "limits": {p: self._provider_limit(p) for p in self._provider_in_flight}
+            }
+
+
+# The process-wide scheduler every ContentRepurposer goes through.
+_scheduler = Scheduler()
+
+
+def get_scheduler() -> Scheduler:
+    """Get the shared scheduler."""
+    return _scheduler
+
+
+def configure_scheduler(**kwargs) -> Scheduler:
+    """Replace the shared scheduler; accepts the Scheduler arguments."""
+    global _scheduler
+    _scheduler = Scheduler(**kwargs)
+    return _scheduler
@@ -3,6 +3,10 @@ Platform-specific prompt templates for content repurposing.
 Each template is optimized for the platform's audience and format.
 """
 
+import hashlib
+import json
+import os
+
 TWITTER_THREAD_TEMPLATE = """You are a social media expert specializing in viral Twitter threads.
 
 Transform the following long-form content into an engaging Twitter thread.
@@ -147,30 +151,87 @@ ORIGINAL CONTENT:
 Generate the TikTok script now:"""
 
 
-# Platform configurations
+DIGEST_TEMPLATE = """You are an editor preparing source notes for a social media team.
+
+Extract the key points of the following long-form content so posts can be written from your notes alone.
+
+RULES:
+- 5-10 bullet points, most important first
+- Keep concrete numbers, names, quotes and examples verbatim
+- Note the core argument and the intended audience
+- Write in English, plain text, no commentary
+
+OUTPUT FORMAT:
+- [Key point]
+- [Key point]
+...
+
+---
+
+ORIGINAL CONTENT:
+{content}
+
+---
+
+Write the key points now:"""
+
+
+# Appended to a platform prompt (built from the digest) for localized output.
+LANGUAGE_INSTRUCTION = """
+
+LANGUAGE: Write the entire post in {language}, adapted naturally for native readers (not a literal translation). Keep the section labels from the OUTPUT FORMAT above exactly as written, in English."""
+
+
+# Settings for the shared digest step used by localized fan-out.
+DIGEST = {
+    "template": DIGEST_TEMPLATE,
+    "max_tokens": 700,
+    "stop": []
+}
+
+
+# Platform configurations. "max_tokens" caps each generation and "stop" lists
+# provider-side stop sequences; constraints.StreamWatchdog enforces the rest
+# while the output streams in. "route" can send a platform to a different
+# "provider" / "model" with its own "temperature" and "max_tokens" (see
+# get_route()); an empty route uses the caller's provider and defaults.
 PLATFORMS = {
     "twitter": {
         "name": "Twitter Thread",
         "template": TWITTER_THREAD_TEMPLATE,
         "max_length": 280,  # per tweet
+        "min_tweets": 5,
+        "max_tweets": 8,
+        "max_tokens": 1000,
+        "stop": ["\nTweet 9"],
+        "route": {},
         "description": "5-8 tweet thread optimized for engagement"
     },
     "linkedin": {
         "name": "LinkedIn Post",
         "template": LINKEDIN_POST_TEMPLATE,
         "max_length": 3000,
+        "max_tokens": 1000,
+        "stop": [],
+        "route": {},
         "description": "Professional post with thought leadership tone"
     },
     "instagram": {
         "name": "Instagram Caption",
         "template": INSTAGRAM_CAPTION_TEMPLATE,
         "max_length": 2200,
+        "max_tokens": 800,
+        "stop": [],
+        "route": {},
         "description": "Engaging caption with emojis and hashtags"
     },
     "tiktok": {
         "name": "TikTok Script",
         "template": TIKTOK_SCRIPT_TEMPLATE,
         "max_length": 180,  # spoken words
+        "max_tokens": 600,
+        "stop": [],
+        "route": {},
         "description": "60-second video script with visual cues"
     }
 }
@@ -183,6 +244,47 @@ def get_template(platform: str) -> str:
     return PLATFORMS[platform]["template"]
 
 
+def get_template_version(platform: str) -> str:
+    """Short hash of a platform's template, recorded alongside generations."""
+    return hashlib.sha256(get_template(platform).encode("utf-8")).hexdigest()[:12]
+
+
+# Route fields a platform policy may set.
+ROUTE_KEYS = ("provider", "model", "temperature", "max_tokens")
+
+# JSON file of {platform: route} overriding the routes above, e.g. the
+# output of "python routing.py benchmark ... --write routes.json".
+ROUTES_ENV = "REPURPOSER_ROUTES"
+
+_route_files = {}
+
+
+def _load_routes(path: str) -> dict:
+    mtime = os.path.getmtime(path)
+    cached = _route_files.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "r") as f:
+            routes = json.load(f)
+        for platform, route in routes.items():
+            unknown = set(route) - set(ROUTE_KEYS)
+            if platform not in PLATFORMS or unknown:
+                raise ValueError(f"Invalid route for {platform} in {path}: {sorted(unknown) or 'unknown platform'}")
+        _route_files[path] = cached = (mtime, routes)
+    return cached[1]
+
+
+def get_route(platform: str) -> dict:
+    """
+    Routing policy for a platform: its "route" merged with any override from
+    the REPURPOSER_ROUTES file. Missing keys mean "caller's default".
+    """
+    route = dict(PLATFORMS[platform].get("route") or {})
+    path = os.getenv(ROUTES_ENV)
+    if path:
+        route.update(_load_routes(path).get(platform, {}))
+    return route
+
+
 def get_all_platforms() -> list:
     """Get list of all supported platforms."""
     return list(PLATFORMS.keys())
@@ -0,0 +1,58 @@
+"""
+End-to-end tests for batch.py against the stand-in server in batch_stub.py.
+Run with: python -m unittest test_batch (or python -m pytest test_batch.py)
+"""
+
+import unittest
+
+from batch import BatchRepurposer
+from batch_stub import BatchStubServer
+from repurposer import ContentRepurposer
+from templates import PLATFORMS
+
+
+ARTICLES = ["First article about remote work.", "Second article about hiring."]
+CHAT_PATHS = {"openai": "/chat/completions", "anthropic": "/messages"}
+
+
+def _reply(custom_id: str, body: dict):
+    return None if custom_id == "a1-linkedin" else f"Stub reply for {custom_id}"
+
+
+class BatchRoundTripTest(unittest.TestCase):
+
+    def _round_trip(self, provider: str):
+        with BatchStubServer(polls_to_finish=2, reply=_reply) as server:
+            repurposer = ContentRepurposer(
+                api_key="test-key", provider=provider, priority="bulk",
+                base_url=server.url + CHAT_PATHS[provider], routing=False
+            )
+            batcher = BatchRepurposer(repurposer)
+            job = batcher.submit(ARTICLES, ["twitter", "linkedin"])
+            state = batcher.wait(job, poll_interval=0.01, timeout=5)
+            results = batcher.results(job, state)
+        return server, results
+
+    def _check(self, provider: str, stop_field: str):
+        server, results = self._round_trip(provider)
+
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]["twitter"], "Stub reply for a0-twitter")
+        self.assertEqual(results[0]["linkedin"], "Stub reply for a0-linkedin")
+        self.assertEqual(results[1]["twitter"], "Stub reply for a1-twitter")
+        self.assertTrue(results[1]["linkedin"].startswith("Error: "))
+
+        for platform in ("twitter", "linkedin"):
+            body = server.requests[f"a0-{platform}"]
+            self.assertEqual(body["max_tokens"], PLATFORMS[platform]["max_tokens"])
+            self.assertEqual(body.get(stop_field, []), PLATFORMS[platform]["stop"])
+
+    def test_openai(self):
+        self._check("openai", "stop")
+
+    def test_anthropic(self):
+        self._check("anthropic", "stop_sequences")
+
+
+if __name__ == "__main__":
+    unittest.main()
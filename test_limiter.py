@@ -0,0 +1,87 @@
+"""
+Simulated-load tests for limiter.AdaptiveLimiter.
+Run with: python -m unittest test_limiter (or python -m pytest test_limiter.py)
+"""
+
+import heapq
+import random
+import unittest
+from unittest import mock
+
+from limiter import AdaptiveLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def simulate(limiter: AdaptiveLimiter, latency, calls: int, key: str = "linkedin") -> list:
+    """
+    Keep the limiter saturated for `calls` completions.
+
+    latency(in_flight) gives each call's duration. Returns the limit after
+    every completion.
+    """
+    clock = FakeClock()
+    running, limits = [], []
+    with mock.patch("limiter.time.monotonic", clock):
+        for _ in range(calls):
+            while len(running) < limiter.limit:
+                started = limiter.begin()
+                heapq.heappush(running, (clock.now + latency(len(running) + 1), started))
+            finished, started = heapq.heappop(running)
+            clock.now = finished
+            limiter.end(started, "ok", key)
+            limits.append(limiter.limit)
+    return limits
+
+
+class AdaptiveLimiterTest(unittest.TestCase):
+
+    def test_holds_under_load_independent_noise(self):
+        # Latency spreads 2-12s whatever the concurrency: nothing to back off from.
+        rng = random.Random(7)
+        limiter = AdaptiveLimiter(initial_limit=32, max_limit=64)
+        limits = simulate(limiter, lambda in_flight: rng.uniform(2.0, 12.0), 5000)
+        self.assertGreaterEqual(min(limits), 32)
+        self.assertEqual(limits[-1], 64)
+
+    def test_holds_under_long_tailed_noise(self):
+        rng = random.Random(7)
+        limiter = AdaptiveLimiter(initial_limit=32, max_limit=64)
+        limits = simulate(limiter, lambda in_flight: rng.lognormvariate(1.5, 0.6), 5000)
+        self.assertGreaterEqual(min(limits), 32)
+
+    def test_backs_off_when_load_slows_the_provider(self):
+        # The provider serves 16 calls at full speed; past that everything is 3x slower.
+        rng = random.Random(7)
+        limiter = AdaptiveLimiter(initial_limit=8, max_limit=64)
+        limits = simulate(limiter, lambda in_flight: rng.uniform(2.0, 4.0) * (3 if in_flight > 16 else 1), 5000)
+        self.assertLessEqual(max(limits[-2000:]), 20)
+
+    def test_recovers_when_the_provider_is_slower_for_everyone(self):
+        # After 1000 calls every call takes 3x longer, at any concurrency.
+        rng = random.Random(7)
+        calls = []
+
+        def latency(in_flight):
+            calls.append(in_flight)
+            return rng.uniform(2.0, 4.0) * (3 if len(calls) > 1000 else 1)
+
+        limiter = AdaptiveLimiter(initial_limit=16, max_limit=64)
+        limits = simulate(limiter, latency, 6000)
+        self.assertEqual(limits[-1], 64)
+
+    def test_rate_limits_cut_the_limit(self):
+        limiter = AdaptiveLimiter(initial_limit=32)
+        with mock.patch("limiter.time.monotonic", return_value=1000.0):
+            limiter.end(limiter.begin(), "rate_limited", "twitter")
+        self.assertEqual(limiter.limit, 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
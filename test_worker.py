@@ -0,0 +1,177 @@
+"""
+Tests for the lease queue and Worker in worker.py against SQLiteTaskQueue.
+Run with: python -m unittest test_worker (or python -m pytest test_worker.py)
+
+Claims made with a negative lease_seconds are already expired, which stands
+in for a worker that stopped heartbeating without waiting out a real lease.
+"""
+
+import os
+import sqlite3
+import tempfile
+import threading
+import unittest
+
+from worker import SQLiteTaskQueue, Worker
+
+
+ARTICLES = ["First article about remote work.", "Second article about hiring."]
+EXPIRED = -1.0
+
+
+class QueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, "queue.db")
+        self.queue = SQLiteTaskQueue(self.path, max_attempts=2)
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def _enqueue_one(self) -> str:
+        return self.queue.enqueue(ARTICLES[:1], ["twitter"], provider="openai", job="job1")
+
+    def test_expired_lease_is_requeued(self):
+        self._enqueue_one()
+        [task] = self.queue.claim("a", lease_seconds=EXPIRED)
+        self.assertEqual(task["attempt"], 1)
+        self.assertEqual(self.queue.stats()["tasks"]["leased"], 1)
+
+        self.assertEqual(self.queue.requeue_expired(), 1)
+        self.assertEqual(self.queue.stats()["tasks"]["queued"], 1)
+
+        [again] = self.queue.claim("b")
+        self.assertEqual(again["id"], task["id"])
+        self.assertEqual(again["attempt"], 2)
+
+    def test_heartbeat_renews_only_held_leases(self):
+        self._enqueue_one()
+        [task] = self.queue.claim("a")
+        self.assertEqual(self.queue.heartbeat("a", [task["id"]]), {task["id"]})
+        self.assertEqual(self.queue.heartbeat("b", [task["id"]]), set())
+
+    def test_late_complete_is_fenced(self):
+        self._enqueue_one()
+        [stale] = self.queue.claim("a", lease_seconds=EXPIRED)
+        [fresh] = self.queue.claim("b")
+
+        self.assertFalse(self.queue.complete(stale, "a", output="from a"))
+        self.assertTrue(self.queue.complete(fresh, "b", output="from b"))
+        self.assertFalse(self.queue.complete(fresh, "b", output="duplicate"))
+        self.assertEqual(self.queue.results("job1"), [{"twitter": "from b"}])
+
+    def test_enqueue_is_idempotent(self):
+        job = self.queue.enqueue(ARTICLES, ["twitter", "linkedin"], job="job1")
+        [task] = self.queue.claim("a")
+        self.assertEqual(self.queue.enqueue(ARTICLES, ["twitter", "linkedin"], job=job), job)
+
+        counts = self.queue.stats()["tasks"]
+        self.assertEqual(counts, {"queued": 3, "leased": 1, "done": 0, "failed": 0})
+        self.assertEqual(self.queue.heartbeat("a", [task["id"]]), {task["id"]})
+
+    def test_expired_leases_fail_after_max_attempts(self):
+        self._enqueue_one()
+        for attempt in (1, 2):
+            [task] = self.queue.claim("a", lease_seconds=EXPIRED)
+            self.assertEqual(task["attempt"], attempt)
+        self.assertEqual(self.queue.claim("a"), [])
+
+        counts = self.queue.stats()["tasks"]
+        self.assertEqual((counts["queued"], counts["failed"]), (0, 1))
+        self.assertEqual(self.queue.results("job1"), [{"twitter": "Error: lease expired 2 times"}])
+
+    def test_failed_attempts_retry_until_max_attempts(self):
+        self._enqueue_one()
+        [task] = self.queue.claim("a")
+        self.assertTrue(self.queue.complete(task, "a", error="HTTP 503"))
+        self.assertEqual(self.queue.stats()["tasks"]["queued"], 1)
+
+        [task] = self.queue.claim("a")
+        self.assertTrue(self.queue.complete(task, "a", error="HTTP 503"))
+        self.assertEqual(self.queue.results("job1"), [{"twitter": "Error: HTTP 503"}])
+
+    def test_permanent_error_is_not_retried(self):
+        self._enqueue_one()
+        [task] = self.queue.claim("a")
+        self.assertTrue(self.queue.complete(task, "a", error="bad platform", retry=False))
+        self.assertEqual(self.queue.stats()["tasks"]["failed"], 1)
+
+
+class FakeHistory:
+
+    def __init__(self):
+        self.records = []
+
+    def record(self, content, platform, provider, **fields):
+        self.records.append((platform, fields["output"]))
+
+
+class FakeRepurposer:
+    provider = "openai"
+
+    def __init__(self, history=None):
+        self.history = history
+
+    def repurpose(self, content, platform, with_stop_reason=False):
+        return f"{platform}: {content}", None
+
+    def route(self, platform):
+        return {"provider": self.provider, "model": "stub"}
+
+
+class FlakyQueue(SQLiteTaskQueue):
+    """Fails its first heartbeats with lock contention."""
+
+    def __init__(self, path, failures):
+        super().__init__(path)
+        self.failures = failures
+        self.beats = 0
+        self.beaten = threading.Event()
+
+    def heartbeat(self, worker_id, task_ids=(), lease_seconds=60.0):
+        self.beats += 1
+        if self.beats <= self.failures:
+            raise sqlite3.OperationalError("database is locked")
+        self.beaten.set()
+        return super().heartbeat(worker_id, task_ids, lease_seconds)
+
+
+class WorkerTest(unittest.TestCase):
+
+    def setUp(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._dir.name, "queue.db")
+
+    def tearDown(self):
+        self._dir.cleanup()
+
+    def test_runs_queue_and_records_history_once(self):
+        queue = SQLiteTaskQueue(self.path)
+        job = queue.enqueue(ARTICLES, ["twitter", "linkedin"], provider="openai")
+        history = FakeHistory()
+        repurposer = FakeRepurposer(history)
+
+        worker = Worker(queue, repurposer, concurrency=2)
+        worker.run(until_empty=True, poll_interval=0.01)
+
+        self.assertIs(repurposer.history, history)
+        self.assertEqual(worker.completed, 4)
+        self.assertEqual(len(history.records), 4)
+        self.assertEqual(queue.results(job)[1]["linkedin"], f"linkedin: {ARTICLES[1]}")
+
+    def test_heartbeat_survives_backend_errors(self):
+        queue = FlakyQueue(self.path, failures=2)
+        worker = Worker(queue, FakeRepurposer(), lease_seconds=0.03)
+        beat = threading.Thread(target=worker._heartbeat_loop)
+        beat.start()
+        try:
+            self.assertTrue(queue.beaten.wait(5))
+        finally:
+            worker.stop()
+            beat.join()
+        self.assertGreater(queue.beats, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
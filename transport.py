@@ -0,0 +1,361 @@
+"""
+HTTP transports for provider calls.
+The default transport talks to the network with urllib. RecordingTransport
+captures request/response pairs (with timing and streaming chunk cadence) to
+a cassette, and ReplayTransport plays a cassette back with the original or
+scaled latencies, so concurrency changes can be benchmarked offline.
+
+Cassettes are JSON Lines, gzip-compressed when the path ends in ".gz". Only a
+hash of each request body is stored, never prompts or credentials.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+
+# Response headers worth keeping in a cassette.
+RECORDED_HEADERS = ("content-type", "retry-after")
+
+
+def request_key(url: str, body: bytes) -> str:
+    """Identify a request by endpoint path and canonical JSON body."""
+    try:
+        canonical = json.dumps(json.loads(body), sort_keys=True).encode("utf-8")
+    except ValueError:
+        canonical = body
+    path = urllib.parse.urlsplit(url).path
+    return hashlib.sha256(path.encode("utf-8") + b"\n" + canonical).hexdigest()[:24]
+
+
+def _lower_headers(headers) -> dict:
+    return {k.lower(): v for k, v in headers.items()} if headers else {}
+
+
+class StreamResponse:
+    """
+    A streaming response: iterate for body chunks (lines for SSE), call
+    close() to cancel the request early.
+    """
+
+    def __init__(self, status: int, headers: dict, chunks, close=None):
+        self.status = status
+        self.headers = headers
+        self._chunks = chunks
+        self._close = close
+
+    def __iter__(self):
+        return iter(self._chunks)
+
+    def close(self):
+        if hasattr(self._chunks, "close"):
+            self._chunks.close()
+        if self._close is not None:
+            self._close()
+            self._close = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class UrllibTransport:
+    """Sends requests over the network with urllib."""
+
+    def _open(self, url: str, body: bytes, headers: dict, timeout: float):
+        req = urllib.request.Request(url, data=body, headers=headers, method="POST")
+        try:
+            return urllib.request.urlopen(req, timeout=timeout)
+        except urllib.error.HTTPError as e:
+            return e
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, (TimeoutError, socket.timeout)):
+                raise TimeoutError(f"timed out: {e.reason}")
+            raise ConnectionError(str(e.reason))
+
+    def request(self, url: str, body: bytes, headers: dict, timeout: float) -> dict:
+        """
+        POST a body and return {"status", "headers", "body"}.
+
+        HTTP error statuses are returned, not raised.
+
+        Raises:
+            TimeoutError: if the server did not answer in time
+            ConnectionError: for network failures
+        """
+        response = self._open(url, body, headers, timeout)
+        try:
+            return {
+                "status": response.status if hasattr(response, "status") else response.code,
+                "headers": _lower_headers(response.headers),
+                "body": response.read()
+            }
+        except socket.timeout as e:
+            raise TimeoutError(f"timed out: {e}")
+        finally:
+            response.close()
+
+    def stream(self, url: str, body: bytes, headers: dict, timeout: float) -> StreamResponse:
+        """POST a body and return a StreamResponse yielding response lines."""
+        response = self._open(url, body, headers, timeout)
+
+        def chunks():
+            try:
+                for line in response:
+                    yield line
+            except socket.timeout as e:
+                raise TimeoutError(f"timed out: {e}")
+            finally:
+                response.close()
+
+        status = response.status if hasattr(response, "status") else response.code
+        return StreamResponse(status, _lower_headers(response.headers), chunks(), response.close)
+
+
+def _open_cassette(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class RecordingTransport:
+    """
+    Wraps another transport and appends every exchange to a cassette.
+
+    Entries hold the request key, URL, status, selected headers, total
+    latency and either the body or each streamed chunk with its offset.
+    """
+
+    def __init__(self, path: str, inner=None):
+        self.path = path
+        self.inner = inner or UrllibTransport()
+        self._lock = threading.Lock()
+
+    def _write(self, entry: dict):
+        with self._lock, _open_cassette(self.path, "a") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _entry(self, url: str, body: bytes) -> dict:
+        return {
+            "key": request_key(url, body),
+            "url": url,
+            "recorded_at": time.time()
+        }
+
+    def request(self, url: str, body: bytes, headers: dict, timeout: float) -> dict:
+        started = time.monotonic()
+        entry = self._entry(url, body)
+        try:
+            response = self.inner.request(url, body, headers, timeout)
+        except (TimeoutError, ConnectionError) as e:
+            entry.update(
+                error="timeout" if isinstance(e, TimeoutError) else "connection",
+                message=str(e),
+                latency=time.monotonic() - started
+            )
+            self._write(entry)
+            raise
+        entry.update(
+            status=response["status"],
+            headers={k: v for k, v in response["headers"].items() if k in RECORDED_HEADERS},
+            latency=time.monotonic() - started,
+            body=response["body"].decode("utf-8", errors="replace")
+        )
+        self._write(entry)
+        return response
+
+    def stream(self, url: str, body: bytes, headers: dict, timeout: float) -> StreamResponse:
+        started = time.monotonic()
+        entry = self._entry(url, body)
+        try:
+            response = self.inner.stream(url, body, headers, timeout)
+        except (TimeoutError, ConnectionError) as e:
+            entry.update(
+                error="timeout" if isinstance(e, TimeoutError) else "connection",
+                message=str(e),
+                latency=time.monotonic() - started
+            )
+            self._write(entry)
+            raise
+        entry.update(
+            status=response.status,
+            headers={k: v for k, v in response.headers.items() if k in RECORDED_HEADERS}
+        )
+
+        if response.status >= 400:
+            # Callers usually drop error responses unread, so read and record
+            # the (small) body now rather than waiting for iteration.
+            data = []
+            try:
+                data = list(response)
+            except (TimeoutError, ConnectionError):
+                pass
+            finally:
+                response.close()
+            entry.update(
+                latency=time.monotonic() - started,
+                body=b"".join(data).decode("utf-8", errors="replace")
+            )
+            self._write(entry)
+            return StreamResponse(response.status, response.headers, data)
+
+        entry.update(ttfb=time.monotonic() - started, chunks=[])
+        written = []
+
+        def finish():
+            # Runs once, whether the stream was read to the end, cut short
+            # or closed before the first chunk.
+            if not written:
+                written.append(True)
+                entry["latency"] = time.monotonic() - started
+                self._write(entry)
+
+        def chunks():
+            try:
+                for chunk in response:
+                    entry["chunks"].append([
+                        round(time.monotonic() - started, 4),
+                        chunk.decode("utf-8", errors="replace")
+                    ])
+                    yield chunk
+            finally:
+                finish()
+
+        def close():
+            finish()
+            response.close()
+
+        return StreamResponse(response.status, response.headers, chunks(), close)
+
+
+class ReplayTransport:
+    """
+    Serves responses from a cassette instead of the network.
+
+    Args:
+        path: Cassette written by RecordingTransport
+        latency_scale: Multiplier for recorded latencies (0 = no delay)
+        match: "key" serves the recording for the same request (cycling
+            through repeats); "sequential" ignores the request and replays
+            entries in recorded order, reproducing a traffic shape
+    """
+
+    def __init__(self, path: str, latency_scale: float = 1.0, match: str = "key"):
+        if match not in ("key", "sequential"):
+            raise ValueError(f"Unknown match mode: {match}. Available: ['key', 'sequential']")
+        self.latency_scale = latency_scale
+        self.match = match
+        self._lock = threading.Lock()
+        with _open_cassette(path, "r") as f:
+            self.entries = [json.loads(line) for line in f if line.strip()]
+        if not self.entries:
+            raise ValueError(f"Cassette is empty: {path}")
+
+        self._by_key = {}
+        for entry in self.entries:
+            self._by_key.setdefault(entry["key"], []).append(entry)
+        self._cursor = {}
+
+    def _next(self, url: str, body: bytes) -> dict:
+        with self._lock:
+            if self.match == "sequential":
+                index = self._cursor.get(None, 0)
+                self._cursor[None] = index + 1
+                return self.entries[index % len(self.entries)]
+
+            key = request_key(url, body)
+            recordings = self._by_key.get(key)
+            if not recordings:
+                raise ConnectionError(f"No recording for request {key} to {url}")
+            index = self._cursor.get(key, 0)
+            self._cursor[key] = index + 1
+            return recordings[index % len(recordings)]
+
+    def _sleep(self, seconds: float, timeout: float):
+        """
+        Sleep a scaled delay, raising TimeoutError if it overruns timeout.
+        Like a socket timeout, timeout bounds each wait (time to first byte,
+        gap between chunks), not the response as a whole.
+        """
+        delay = seconds * self.latency_scale
+        if delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"timed out after {timeout:.1f}s (replayed)")
+        time.sleep(delay)
+
+    def request(self, url: str, body: bytes, headers: dict, timeout: float) -> dict:
+        entry = self._next(url, body)
+        self._sleep(entry.get("latency", 0.0), timeout)
+        if entry.get("error") == "timeout":
+            raise TimeoutError(entry.get("message", "timed out (replayed)"))
+        if entry.get("error"):
+            raise ConnectionError(entry.get("message", "connection failed (replayed)"))
+        if "chunks" in entry:
+            data = "".join(chunk for _, chunk in entry["chunks"])
+        else:
+            data = entry.get("body", "")
+        return {"status": entry["status"], "headers": dict(entry.get("headers", {})), "body": data.encode("utf-8")}
+
+    def stream(self, url: str, body: bytes, headers: dict, timeout: float) -> StreamResponse:
+        entry = self._next(url, body)
+        if entry.get("error"):
+            self._sleep(entry.get("latency", 0.0), timeout)
+            error = TimeoutError if entry["error"] == "timeout" else ConnectionError
+            raise error(entry.get("message", "replayed failure"))
+        if "chunks" in entry:
+            self._sleep(entry.get("ttfb", 0.0), timeout)
+            recorded = entry["chunks"]
+        else:
+            # A non-streamed recording replays as a single chunk.
+            recorded = [[entry.get("latency", 0.0), entry.get("body", "")]]
+
+        closed = threading.Event()
+
+        def chunks():
+            previous = entry.get("ttfb", 0.0) if "chunks" in entry else 0.0
+            for offset, chunk in recorded:
+                if closed.is_set():
+                    return
+                self._sleep(max(0.0, offset - previous), timeout)
+                previous = offset
+                yield chunk.encode("utf-8")
+
+        return StreamResponse(entry["status"], dict(entry.get("headers", {})), chunks(), closed.set)
+
+
+_default_transports = {}
+_default_lock = threading.Lock()
+
+
+def get_default_transport():
+    """
+    Shared transport selected by environment:
+
+    REPURPOSER_RECORD=<cassette>   record real traffic
+    REPURPOSER_REPLAY=<cassette>   replay instead of calling providers
+    REPURPOSER_REPLAY_SCALE=<x>    latency multiplier for replay (default 1)
+    REPURPOSER_REPLAY_MATCH=<mode> "key" (default) or "sequential"
+    """
+    settings = tuple(os.getenv(name) for name in (
+        "REPURPOSER_REPLAY", "REPURPOSER_REPLAY_SCALE", "REPURPOSER_REPLAY_MATCH", "REPURPOSER_RECORD"
+    ))
+    with _default_lock:
+        if settings not in _default_transports:
+            replay, scale, match, record = settings
+            if replay:
+                transport = ReplayTransport(replay, latency_scale=float(scale or 1), match=match or "key")
+            elif record:
+                transport = RecordingTransport(record)
+            else:
+                transport = UrllibTransport()
+            _default_transports[settings] = transport
+        return _default_transports[settings]
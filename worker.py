@@ -0,0 +1,651 @@
+"""
+Distributed worker mode.
+Article x platform tasks live in a shared durable queue; any number of worker
+processes, on any number of nodes, lease tasks from it, renew their leases
+with heartbeats while generating, and write results back. A worker that
+crashes stops heartbeating, its leases expire and the tasks are re-queued for
+someone else. Result writes are fenced by the lease, so a task finishes
+exactly once even if a slow worker comes back after losing it.
+
+Across nodes the queue is PostgreSQL: claims use SELECT ... FOR UPDATE SKIP
+LOCKED and lease times come from the database clock. SQLiteTaskQueue is the
+single-host stand-in for development and tests; it relies on local file
+locks and WAL shared memory, so never put its file on a network filesystem.
+"""
+
+import copy
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+except ImportError:  # only needed for the PostgreSQL queue
+    psycopg = None
+
+from history import content_hash
+from templates import get_all_platforms, get_template_version
+
+
+# Seconds a claimed task stays reserved without a heartbeat.
+LEASE_SECONDS = 60.0
+
+# Attempts (leases) per task before it is marked failed.
+MAX_ATTEMPTS = 3
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contents (
+    content_hash TEXT PRIMARY KEY,
+    content TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    job TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    content_hash TEXT NOT NULL REFERENCES contents(content_hash),
+    platform TEXT NOT NULL,
+    provider TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    output TEXT,
+    error TEXT,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL,
+    UNIQUE (job, position, platform)
+);
+
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status, id);
+CREATE INDEX IF NOT EXISTS idx_tasks_lease ON tasks(status, lease_expires);
+CREATE INDEX IF NOT EXISTS idx_tasks_finished ON tasks(finished_at);
+
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    host TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+# Same tables for PostgreSQL; times stay Unix seconds, in double precision.
+POSTGRES_SCHEMA = (
+    SQLITE_SCHEMA
+    .replace("id INTEGER PRIMARY KEY", "id BIGSERIAL PRIMARY KEY")
+    .replace("REAL", "DOUBLE PRECISION")
+)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class TaskQueue:
+    """
+    Durable queue of article x platform tasks shared by every worker.
+
+    Task states: queued -> leased -> done | failed. A lease expires unless
+    its owner heartbeats; expired tasks go back to queued (or to failed once
+    they have used MAX_ATTEMPTS leases).
+
+    Backends implement _connect(), _write(), _now() and _claim_ids(); SQL
+    here is written with "?" placeholders and passed through _sql().
+    transient_errors lists the backend's exception types that a retry may
+    clear (lock contention, a dropped connection).
+    """
+
+    transient_errors: tuple = ()
+
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+
+    def _connect(self):
+        raise NotImplementedError
+
+    def _write(self, fn):
+        """Run fn(conn) in one write transaction and return its result."""
+        raise NotImplementedError
+
+    def _now(self, conn) -> float:
+        """Current Unix time as the queue sees it."""
+        raise NotImplementedError
+
+    def _claim_ids(self, conn, worker_id: str, limit: int, expires: float,
+                   provider: Optional[str]) -> list:
+        """Lease up to limit queued tasks inside _write(); returns their ids."""
+        raise NotImplementedError
+
+    def _sql(self, sql: str) -> str:
+        return sql
+
+    def _execute(self, conn, sql: str, params=()):
+        return conn.execute(self._sql(sql), params)
+
+    def enqueue(self, contents: list, platforms: Optional[list] = None,
+                provider: str = "zai", job: Optional[str] = None) -> str:
+        """
+        Queue every article x platform pair.
+
+        Re-enqueueing the same job id is a no-op for tasks already queued,
+        so a coordinator can safely retry a partially failed submission.
+
+        Returns:
+            The job id
+        """
+        platforms = platforms or get_all_platforms()
+        job = job or uuid.uuid4().hex[:12]
+
+        def write(conn):
+            now = self._now(conn)
+            cursor = conn.cursor()
+            for position, content in enumerate(contents):
+                digest = content_hash(content)
+                self._execute(
+                    conn,
+                    "INSERT INTO contents (content_hash, content) VALUES (?, ?) ON CONFLICT DO NOTHING",
+                    (digest, content)
+                )
+                cursor.executemany(
+                    self._sql("""INSERT INTO tasks
+                                 (job, position, content_hash, platform, provider, enqueued_at)
+                                 VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING"""),
+                    [(job, position, digest, platform, provider, now) for platform in platforms]
+                )
+
+        self._write(write)
+        return job
+
+    def _expire(self, conn, now: float) -> int:
+        """Re-queue (or fail) tasks whose lease has run out."""
+        self._execute(
+            conn,
+            """UPDATE tasks SET status = 'failed', lease_owner = NULL, finished_at = ?,
+                      error = 'lease expired ' || attempts || ' times'
+               WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?""",
+            (now, now, self.max_attempts)
+        )
+        return self._execute(
+            conn,
+            """UPDATE tasks SET status = 'queued', lease_owner = NULL, lease_expires = NULL
+               WHERE status = 'leased' AND lease_expires < ?""",
+            (now,)
+        ).rowcount
+
+    def requeue_expired(self) -> int:
+        """Return tasks held by dead workers to the queue; returns the count."""
+        return self._write(lambda conn: self._expire(conn, self._now(conn)))
+
+    def claim(self, worker_id: str, limit: int = 1, lease_seconds: float = LEASE_SECONDS,
+              provider: Optional[str] = None) -> list:
+        """
+        Lease up to limit queued tasks, oldest first.
+
+        Returns:
+            Task dicts with id, job, position, platform, provider, content and
+            attempt (the fencing token complete() needs)
+        """
+        def write(conn):
+            now = self._now(conn)
+            self._expire(conn, now)
+            ids = self._claim_ids(conn, worker_id, limit, now + lease_seconds, provider)
+            if not ids:
+                return []
+            marks = ",".join("?" * len(ids))
+            rows = self._execute(
+                conn,
+                f"""SELECT t.id, t.job, t.position, t.platform, t.provider,
+                           t.attempts AS attempt, c.content
+                    FROM tasks t JOIN contents c ON c.content_hash = t.content_hash
+                    WHERE t.id IN ({marks}) ORDER BY t.id""",
+                ids
+            ).fetchall()
+            return [dict(row) for row in rows]
+
+        return self._write(write)
+
+    def heartbeat(self, worker_id: str, task_ids: list = (),
+                  lease_seconds: float = LEASE_SECONDS) -> set:
+        """
+        Mark the worker alive and extend its leases.
+
+        Returns:
+            The ids of task_ids the worker still holds; a missing id means the
+            lease was lost and the result will be rejected
+        """
+        def write(conn):
+            now = self._now(conn)
+            self._execute(
+                conn,
+                """INSERT INTO workers (id, host, pid, started_at, heartbeat_at) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (id) DO UPDATE SET heartbeat_at = excluded.heartbeat_at""",
+                (worker_id, socket.gethostname(), os.getpid(), now, now)
+            )
+            held = set()
+            for task_id in task_ids:
+                renewed = self._execute(
+                    conn,
+                    """UPDATE tasks SET lease_expires = ?
+                       WHERE id = ? AND status = 'leased' AND lease_owner = ?""",
+                    (now + lease_seconds, task_id, worker_id)
+                ).rowcount
+                if renewed:
+                    held.add(task_id)
+            return held
+
+        return self._write(write)
+
+    def complete(self, task: dict, worker_id: str, output: Optional[str] = None,
+                 error: Optional[str] = None, retry: bool = True) -> bool:
+        """
+        Write a task's result if the worker still holds its lease.
+
+        A failed attempt goes back to the queue while attempts remain (and
+        retry is set). Duplicate or late writes are ignored.
+
+        Returns:
+            True if this call recorded the result
+        """
+        requeue = error is not None and retry and task["attempt"] < self.max_attempts
+
+        def write(conn):
+            fence = "WHERE id = ? AND status = 'leased' AND lease_owner = ? AND attempts = ?"
+            key = (task["id"], worker_id, task["attempt"])
+            if requeue:
+                sql = f"""UPDATE tasks SET status = 'queued', lease_owner = NULL,
+                                 lease_expires = NULL, error = ? {fence}"""
+                return self._execute(conn, sql, (error,) + key).rowcount == 1
+            sql = f"""UPDATE tasks SET status = ?, output = ?, error = ?, lease_owner = NULL,
+                             lease_expires = NULL, finished_at = ? {fence}"""
+            status = "failed" if error is not None else "done"
+            return self._execute(conn, sql, (status, output, error, self._now(conn)) + key).rowcount == 1
+
+        return self._write(write)
+
+    def results(self, job: str) -> list:
+        """
+        Results of a job in enqueue order: one {platform: text} per article.
+        Failed tasks read "Error: ..."; unfinished ones are None.
+        """
+        rows = self._execute(
+            self._connect(),
+            "SELECT position, platform, status, output, error FROM tasks WHERE job = ? ORDER BY position",
+            (job,)
+        ).fetchall()
+        results = {}
+        for row in rows:
+            if row["status"] == "done":
+                value = row["output"]
+            elif row["status"] == "failed":
+                value = f"Error: {row['error']}"
+            else:
+                value = None
+            results.setdefault(row["position"], {})[row["platform"]] = value
+        return [results[position] for position in sorted(results)]
+
+    def stats(self, window: float = 60.0, job: Optional[str] = None) -> dict:
+        """
+        Cluster-wide queue state and throughput.
+
+        Args:
+            window: Seconds of recent completions used for the rate
+            job: Limit task counts and throughput to one job
+        """
+        conn = self._connect()
+        now = self._now(conn)
+        scope, params = ("WHERE job = ?", [job]) if job else ("", [])
+
+        counts = {"queued": 0, "leased": 0, "done": 0, "failed": 0}
+        for row in self._execute(conn, f"SELECT status, COUNT(*) AS n FROM tasks {scope} GROUP BY status", params):
+            counts[row["status"]] = row["n"]
+
+        finished = self._execute(
+            conn,
+            f"""SELECT COUNT(*) AS n FROM tasks
+                WHERE finished_at >= ? {'AND job = ?' if job else ''}""",
+            [now - window] + params
+        ).fetchone()["n"]
+        throughput = finished / window
+        remaining = counts["queued"] + counts["leased"]
+
+        workers = [
+            {
+                "id": row["id"],
+                "host": row["host"],
+                "pid": row["pid"],
+                "last_heartbeat_s": round(now - row["heartbeat_at"], 1),
+                "leased": row["leased"]
+            }
+            for row in self._execute(
+                conn,
+                """SELECT w.*, (SELECT COUNT(*) FROM tasks t
+                                WHERE t.status = 'leased' AND t.lease_owner = w.id) AS leased
+                   FROM workers w WHERE w.heartbeat_at >= ? ORDER BY w.id""",
+                (now - 2 * LEASE_SECONDS,)
+            )
+        ]
+        return {
+            "tasks": counts,
+            "throughput_per_min": round(throughput * 60, 2),
+            "eta_s": round(remaining / throughput, 1) if throughput else None,
+            "window_s": window,
+            "workers": workers
+        }
+
+
+class SQLiteTaskQueue(TaskQueue):
+    """
+    Single-host queue in a local SQLite file: workers are processes on one
+    machine. BEGIN IMMEDIATE serialises claims through SQLite's file lock,
+    which is only reliable on a local disk.
+    """
+
+    transient_errors = (sqlite3.Error,)
+
+    def __init__(self, path: str = "repurposer_queue.db", max_attempts: int = MAX_ATTEMPTS):
+        super().__init__(max_attempts)
+        self.path = path
+        self._connect().executescript(SQLITE_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; _write() opens BEGIN IMMEDIATE itself so two
+            # workers can never claim the same task.
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def _now(self, conn) -> float:
+        return time.time()
+
+    def _claim_ids(self, conn, worker_id, limit, expires, provider):
+        # The write lock is already held, so select-then-update is safe.
+        sql = "SELECT id FROM tasks WHERE status = 'queued'"
+        params = []
+        if provider:
+            sql += " AND provider = ?"
+            params.append(provider)
+        ids = [row["id"] for row in conn.execute(sql + " ORDER BY id LIMIT ?", params + [limit])]
+        if ids:
+            marks = ",".join("?" * len(ids))
+            conn.execute(
+                f"""UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                           attempts = attempts + 1
+                    WHERE id IN ({marks})""",
+                [worker_id, expires] + ids
+            )
+        return ids
+
+
+class PostgresTaskQueue(TaskQueue):
+    """
+    Multi-node queue in PostgreSQL (needs the psycopg package).
+
+    Claims lock queued rows with FOR UPDATE SKIP LOCKED, so concurrent
+    workers on any node take disjoint tasks without blocking each other,
+    and lease times come from the database clock so node clock skew cannot
+    expire a live lease.
+    """
+
+    def __init__(self, dsn: str, max_attempts: int = MAX_ATTEMPTS):
+        if psycopg is None:
+            raise RuntimeError("PostgresTaskQueue needs psycopg: pip install 'psycopg[binary]'")
+        super().__init__(max_attempts)
+        self.transient_errors = (psycopg.Error,)
+        self.dsn = dsn
+        with self._connect().transaction():
+            self._connect().execute(POSTGRES_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn.closed:
+            conn = psycopg.connect(self.dsn, autocommit=True, row_factory=dict_row)
+            self._local.conn = conn
+        return conn
+
+    def _write(self, fn):
+        conn = self._connect()
+        with conn.transaction():
+            return fn(conn)
+
+    def _sql(self, sql: str) -> str:
+        return sql.replace("?", "%s")
+
+    def _now(self, conn) -> float:
+        return conn.execute("SELECT EXTRACT(EPOCH FROM clock_timestamp())::float8 AS now").fetchone()["now"]
+
+    def _claim_ids(self, conn, worker_id, limit, expires, provider):
+        provider_filter = "AND provider = %s" if provider else ""
+        params = [worker_id, expires] + ([provider] if provider else []) + [limit]
+        rows = conn.execute(
+            f"""UPDATE tasks SET status = 'leased', lease_owner = %s, lease_expires = %s,
+                       attempts = attempts + 1
+                WHERE id IN (SELECT id FROM tasks
+                             WHERE status = 'queued' {provider_filter}
+                             ORDER BY id LIMIT %s
+                             FOR UPDATE SKIP LOCKED)
+                RETURNING id""",
+            params
+        ).fetchall()
+        return sorted(row["id"] for row in rows)
+
+
+def open_queue(target: str, max_attempts: int = MAX_ATTEMPTS) -> TaskQueue:
+    """
+    Open a queue by location: a postgres:// or postgresql:// URL for the
+    multi-node queue, anything else as a local SQLite file.
+    """
+    if target.startswith(("postgres://", "postgresql://")):
+        return PostgresTaskQueue(target, max_attempts)
+    return SQLiteTaskQueue(target, max_attempts)
+
+
+class Worker:
+    """
+    Pulls tasks from a TaskQueue and runs them through a ContentRepurposer.
+
+    Args:
+        queue: The shared TaskQueue
+        repurposer: A ContentRepurposer; its provider, key pool, scheduler
+            and limiter govern the calls (only tasks for its provider are
+            claimed). Its history store, if any, receives each result once
+            the queue has accepted it
+        concurrency: Tasks in flight at once on this worker
+        lease_seconds: Lease length; heartbeats renew it every third of that
+        worker_id: Stable id (default: host-pid-random)
+    """
+
+    def __init__(self, queue: TaskQueue, repurposer, concurrency: int = 4,
+                 lease_seconds: float = LEASE_SECONDS, worker_id: Optional[str] = None):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.worker_id = worker_id or default_worker_id()
+        # Results are recorded after the queue accepts them, never twice, so
+        # generation runs on a history-less copy; the caller's is untouched.
+        self.history = repurposer.history
+        self.repurposer = copy.copy(repurposer)
+        self.repurposer.history = None
+        self.completed = 0
+        self.rejected = 0
+        self._inflight = {}
+        self._slots = threading.Condition()
+        self._stopping = threading.Event()
+
+    def stop(self):
+        """Finish in-flight tasks, then return from run()."""
+        self._stopping.set()
+
+    def _heartbeat_loop(self):
+        while not self._stopping.wait(self.lease_seconds / 3):
+            with self._slots:
+                task_ids = list(self._inflight)
+            try:
+                self.queue.heartbeat(self.worker_id, task_ids, self.lease_seconds)
+            except self.queue.transient_errors:
+                pass  # lock contention or a dropped connection; the next beat retries
+
+    def _process(self, task: dict):
+        start = time.monotonic()
+        output = error = stop_reason = None
+        accepted = False
+        try:
+            try:
+                output, stop_reason = self.repurposer.repurpose(
+                    task["content"], task["platform"], with_stop_reason=True
+                )
+                retry = False
+            except ValueError as e:
+                error, retry = str(e), False
+            except Exception as e:
+                error, retry = str(e), True
+            accepted = self.queue.complete(task, self.worker_id, output=output, error=error, retry=retry)
+        finally:
+            with self._slots:
+                del self._inflight[task["id"]]
+                if accepted:
+                    self.completed += 1
+                else:
+                    self.rejected += 1
+                self._slots.notify()
+
+        if accepted and self.history is not None:
+            route = self.repurposer.route(task["platform"])
+            self.history.record(
+                task["content"], task["platform"], route["provider"],
+                output=output,
+                error=error,
+                model=route["model"],
+                template_version=get_template_version(task["platform"]),
+                duration_ms=(time.monotonic() - start) * 1000,
+                stop_reason=stop_reason
+            )
+
+    def run(self, until_empty: bool = False, poll_interval: float = 1.0):
+        """
+        Process tasks until stop() is called (or, with until_empty, until the
+        queue has nothing left to claim and in-flight work is done).
+        """
+        self.queue.heartbeat(self.worker_id, (), self.lease_seconds)
+        beat = threading.Thread(target=self._heartbeat_loop, name=f"heartbeat-{self.worker_id}", daemon=True)
+        beat.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                while not self._stopping.is_set():
+                    with self._slots:
+                        while len(self._inflight) >= self.concurrency:
+                            self._slots.wait()
+                        free = self.concurrency - len(self._inflight)
+
+                    tasks = self.queue.claim(
+                        self.worker_id, limit=free, lease_seconds=self.lease_seconds,
+                        provider=self.repurposer.provider
+                    )
+                    if not tasks:
+                        with self._slots:
+                            idle = not self._inflight
+                        if until_empty and idle:
+                            break
+                        self._stopping.wait(poll_interval)
+                        continue
+
+                    with self._slots:
+                        for task in tasks:
+                            self._inflight[task["id"]] = task
+                    for task in tasks:
+                        pool.submit(self._process, task)
+        finally:
+            self._stopping.set()
+            beat.join()
+
+
+# CLI interface
+if __name__ == "__main__":
+    import argparse
+    import json
+    from repurposer import ContentRepurposer
+    from history import HistoryStore
+
+    parser = argparse.ArgumentParser(description="Distributed repurposing workers and coordinator")
+    parser.add_argument("--queue", default=os.getenv("REPURPOSER_QUEUE", "repurposer_queue.db"),
+                        help="postgresql:// URL shared by all nodes, or a local SQLite file (one host)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_cmd = sub.add_parser("enqueue", help="Queue articles and print the job id")
+    enqueue_cmd.add_argument("files", nargs="+", help="Content files, one article each")
+    enqueue_cmd.add_argument("--provider", default="zai")
+    enqueue_cmd.add_argument("--platforms", default="all", help="Comma-separated platforms or 'all'")
+    enqueue_cmd.add_argument("--job", help="Job id (re-using one makes the enqueue idempotent)")
+
+    work_cmd = sub.add_parser("work", help="Run a worker on this node")
+    work_cmd.add_argument("--provider", default="zai")
+    work_cmd.add_argument("--concurrency", type=int, default=4)
+    work_cmd.add_argument("--lease", type=float, default=LEASE_SECONDS, help="Lease length in seconds")
+    work_cmd.add_argument("--until-empty", action="store_true", help="Exit once the queue is drained")
+
+    status_cmd = sub.add_parser("status", help="Report cluster-wide progress and throughput")
+    status_cmd.add_argument("--job")
+    status_cmd.add_argument("--window", type=float, default=60.0, help="Throughput window in seconds")
+    status_cmd.add_argument("--watch", type=float, help="Refresh every N seconds")
+
+    results_cmd = sub.add_parser("results", help="Print a job's results as JSON")
+    results_cmd.add_argument("job")
+
+    args = parser.parse_args()
+    queue = open_queue(args.queue)
+
+    if args.command == "enqueue":
+        contents = []
+        for path in args.files:
+            with open(path, "r") as f:
+                contents.append(f.read())
+        platforms = None if args.platforms == "all" else args.platforms.split(",")
+        print(queue.enqueue(contents, platforms, provider=args.provider, job=args.job))
+
+    elif args.command == "work":
+        history_db = os.getenv("REPURPOSER_HISTORY_DB", "repurposer_history.db")
+        repurposer = ContentRepurposer(
+            provider=args.provider, priority="bulk",
+            history=HistoryStore(history_db) if history_db else None
+        )
+        worker = Worker(queue, repurposer, concurrency=args.concurrency, lease_seconds=args.lease)
+        print(f"Worker {worker.worker_id} processing {args.provider} tasks")
+        try:
+            worker.run(until_empty=args.until_empty)
+        except KeyboardInterrupt:
+            worker.stop()
+        print(f"Completed {worker.completed} tasks ({worker.rejected} results rejected after lost leases)")
+
+    elif args.command == "status":
+        while True:
+            queue.requeue_expired()
+            print(json.dumps(queue.stats(window=args.window, job=args.job), indent=2))
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+
+    else:
+        print(json.dumps(queue.results(args.job), indent=2))